@@ -1,54 +1,22 @@
-import re
-import pandas as pd
 import pyttsx3
-from sklearn import preprocessing
-from sklearn.tree import DecisionTreeClassifier, _tree
-import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.model_selection import cross_val_score
-from sklearn.svm import SVC
-import csv
 import warnings
+from model_store import model_store
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
 class MedicalChatBot:
     def __init__(self):
-        self.training = pd.read_csv('Data/Training.csv')
-        self.testing = pd.read_csv('Data/Testing.csv')
-        self.cols = self.training.columns[:-1]
-        self.x = self.training[self.cols]
-        self.y = self.training['prognosis']
-        self.y1 = self.y
-
-        self.reduced_data = self.training.groupby(self.training['prognosis']).max()
-
-        self.le = preprocessing.LabelEncoder()
-        self.le.fit(self.y)
-        self.y = self.le.transform(self.y)
-
-        self.x_train, self.x_test, self.y_train, self.y_test = train_test_split(self.x, self.y, test_size=0.33, random_state=42)
-        self.testx = self.testing[self.cols]
-        self.testy = self.testing['prognosis']
-        self.testy = self.le.transform(self.testy)
-
-        self.clf = DecisionTreeClassifier()
-        self.clf = self.clf.fit(self.x_train, self.y_train)
-
-        self.model = SVC()
-        self.model.fit(self.x_train, self.y_train)
-
-        self.importances = self.clf.feature_importances_
-        self.indices = np.argsort(self.importances)[::-1]
-        self.features = self.cols
+        # Same preloaded artifact as the web ChatBot; nothing is read or trained here
+        self.model = model_store.load()
+        self.cols = self.model.columns
+        self.flat_tree = self.model.flat_tree
+        self.symptom_resolver = self.model.symptom_resolver
+        self.symptoms_dict = self.model.symptom_index
+        self.disease_symptoms = self.model.disease_symptoms
 
         self.severityDictionary = {}
         self.description_list = {}
         self.precautionDictionary = {}
 
-        self.symptoms_dict = {}
-        for index, symptom in enumerate(self.x):
-            self.symptoms_dict[symptom] = index
-
     def readn(self, nstr):
         engine = pyttsx3.init()
         engine.setProperty('voice', "english+f5")
@@ -67,25 +35,13 @@ class MedicalChatBot:
             print("It might not be that bad but you should take precautions.")
 
     def getDescription(self):
-        with open('MasterData/symptom_Description.csv') as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=',')
-            for row in csv_reader:
-                self.description_list[row[0]] = row[1]
+        self.description_list = self.model.description_dict
 
     def getSeverityDict(self):
-        with open('MasterData/symptom_severity.csv') as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=',')
-            try:
-                for row in csv_reader:
-                    self.severityDictionary[row[0]] = int(row[1])
-            except:
-                pass
+        self.severityDictionary = self.model.severity_dict
 
     def getprecautionDict(self):
-        with open('MasterData/symptom_precaution.csv') as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=',')
-            for row in csv_reader:
-                self.precautionDictionary[row[0]] = [row[1], row[2], row[3], row[4]]
+        self.precautionDictionary = self.model.precaution_dict
 
     def getInfo(self):
         print("-----------------------------------HealthCare ChatBot-----------------------------------")
@@ -94,44 +50,22 @@ class MedicalChatBot:
         print("Hello, ", name)
 
     def check_pattern(self, dis_list, inp):
-        pred_list = []
-        inp = inp.replace(' ', '_')
-        patt = f"{inp}"
-        regexp = re.compile(patt)
-        pred_list = [item for item in dis_list if regexp.search(item)]
+        matches = self.symptom_resolver.resolve(inp)
+        resolved = self.symptom_resolver.pick(matches)
+        pred_list = [resolved] if resolved else [item for item, score in matches if item in dis_list]
         if (len(pred_list) > 0):
             return 1, pred_list
         else:
             return 0, []
 
     def sec_predict(self, symptoms_exp):
-        df = pd.read_csv('Data/Training.csv')
-        X = df.iloc[:, :-1]
-        y = df['prognosis']
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=20)
-        rf_clf = DecisionTreeClassifier()
-        rf_clf.fit(X_train, y_train)
-
-        symptoms_dict = {symptom: index for index, symptom in enumerate(X)}
-        input_vector = np.zeros(len(symptoms_dict))
-        for item in symptoms_exp:
-            input_vector[[symptoms_dict[item]]] = 1
-
-        return rf_clf.predict([input_vector])
-
-    def print_disease(self, node):
-        node = node[0]
-        val = node.nonzero()
-        disease = self.le.inverse_transform(val[0])
-        return list(map(lambda x: x.strip(), list(disease)))
+        present = {self.symptoms_dict[item] for item in symptoms_exp}
+        return [self.flat_tree.predict_indices(present).strip()]
 
-    def tree_to_code(self, tree, feature_names):
-        tree_ = tree.tree_
-        feature_name = [
-            feature_names[i] if i != _tree.TREE_UNDEFINED else "undefined!"
-            for i in tree_.feature
-        ]
+    def print_disease(self, label):
+        return [label.strip()]
 
+    def tree_to_code(self, tree, feature_names):
         chk_dis = ",".join(feature_names).split(",")
         symptoms_present = []
 
@@ -163,23 +97,22 @@ class MedicalChatBot:
 
         def recurse(node, depth):
             indent = "  " * depth
-            if tree_.feature[node] != _tree.TREE_UNDEFINED:
-                name = feature_name[node]
-                threshold = tree_.threshold[node]
+            if not tree.is_leaf(node):
+                name = feature_names[tree.feature[node]]
+                threshold = tree.threshold[node]
 
                 if name == disease_input:
                     val = 1
                 else:
                     val = 0
                 if val <= threshold:
-                    recurse(tree_.children_left[node], depth + 1)
+                    recurse(tree.children_left[node], depth + 1)
                 else:
                     symptoms_present.append(name)
-                    recurse(tree_.children_right[node], depth + 1)
+                    recurse(tree.children_right[node], depth + 1)
             else:
-                present_disease = self.print_disease(tree_.value[node])
-                red_cols = self.reduced_data.columns
-                symptoms_given = red_cols[self.reduced_data.loc[present_disease].values[0].nonzero()]
+                present_disease = self.print_disease(tree.node_class(node))
+                symptoms_given = [self.cols[i] for i in self.disease_symptoms[present_disease[0]]]
                 print("Are you experiencing any ")
                 symptoms_exp = []
                 for syms in list(symptoms_given):
@@ -216,7 +149,7 @@ class MedicalChatBot:
         self.getDescription()
         self.getprecautionDict()
         self.getInfo()
-        self.tree_to_code(self.clf, self.cols)
+        self.tree_to_code(self.flat_tree, self.cols)
         print("----------------------------------------------------------------------------------------")
 
 if __name__ == "__main__":
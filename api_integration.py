@@ -1,38 +1,71 @@
 import xml.etree.ElementTree as ET
+from http_client import http_client
+from cache import TTLCache, normalize_key, CACHE_DIR
+from knowledge_snapshot import knowledge
+
+NO_INFO = "No specific information available for this condition."
+NO_DETAILS = "Information found, but unable to extract details."
+
+# Health-topic summaries rarely change; misses are kept for an hour
+disease_cache = TTLCache('medlineplus', maxsize=2048, ttl=7 * 86400, negative_ttl=3600,
+                         disk_dir=f"{CACHE_DIR}/medlineplus")
+
+
+class MedlinePlusError(Exception):
+    pass
+
+
+def has_disease_info(info):
+    # get_disease_info reports misses and failures as text, not as None
+    return bool(info) and info not in (NO_INFO, NO_DETAILS) and not info.startswith(("Error", "Unable to fetch"))
+
 
 class MedlinePlusAPI:
     BASE_URL = "https://wsearch.nlm.nih.gov/ws/query"
 
-    def __init__(self, session):
+    def __init__(self, session=None):
         self.session = session
 
     async def get_disease_info(self, disease_name):
+        info = knowledge.get_disease(disease_name)
+        if info is not None:
+            return info
+        try:
+            return await disease_cache.get_or_fetch(
+                normalize_key(disease_name),
+                lambda: self.fetch_disease_info(disease_name),
+                refresh=lambda: MedlinePlusAPI().fetch_disease_info(disease_name),
+                is_negative=lambda info: info in (NO_INFO, NO_DETAILS))
+        except MedlinePlusError as e:
+            return f"Error from MedlinePlus API: {e}"
+        except Exception as e:
+            return f"Unable to fetch information at this time. Error: {str(e)}"
+
+    async def fetch_disease_info(self, disease_name):
         params = {
             "db": "healthTopics",
             "term": disease_name,
             "rettype": "brief",
             "retmax": "1"
         }
-        try:
-            async with self.session.get(self.BASE_URL, params=params) as response:
-                response.raise_for_status()
-                content = await response.text()
-                
-                root = ET.fromstring(content)
-                
-                error = root.find(".//error-msg")
-                if error is not None:
-                    return f"Error from MedlinePlus API: {error.text}"
-
-                documents = root.findall(".//document")
-                if documents:
-                    title = documents[0].find(".//content[@name='title']")
-                    summary = documents[0].find(".//content[@name='FullSummary']")
-                    if title is not None and summary is not None:
-                        return f"Title: {title.text}\nSummary: {summary.text}"
-                    else:
-                        return "Information found, but unable to extract details."
+        async with (self.session or http_client).get(self.BASE_URL, params=params) as response:
+            response.raise_for_status()
+            content = await response.text()
+
+            root = ET.fromstring(content)
+
+            # Upstream errors are raised, so they are never cached
+            error = root.find(".//error-msg")
+            if error is not None:
+                raise MedlinePlusError(error.text)
+
+            documents = root.findall(".//document")
+            if documents:
+                title = documents[0].find(".//content[@name='title']")
+                summary = documents[0].find(".//content[@name='FullSummary']")
+                if title is not None and summary is not None:
+                    return f"Title: {title.text}\nSummary: {summary.text}"
                 else:
-                    return "No specific information available for this condition."
-        except Exception as e:
-            return f"Unable to fetch information at this time. Error: {str(e)}"
\ No newline at end of file
+                    return NO_DETAILS
+            else:
+                return NO_INFO
@@ -3,14 +3,23 @@ from flask_cors import CORS
 from flask import send_from_directory
 import traceback
 from chatbot import ChatBot
+from session_state import SessionManager
+from session_store import create_session_store
+from archive_manager import ArchiveManager
+from cache import CACHES
+from drug_id_cache import drug_ids
+from knowledge_snapshot import knowledge
+from snapshot_builder import SnapshotRefresher
+from search_index import knowledge_index
+from http_client import http_client, request_deadline
+from fanout import first_preferred
 import speech_recognition as sr
 from gtts import gTTS
 import os
 import uuid
-import aiohttp
 import asyncio
 import time
-from api_integration import MedlinePlusAPI
+from api_integration import MedlinePlusAPI, has_disease_info
 from openfda_api import OpenFDAAPI
 from medication_api import MedicationAPI
 import xmltodict
@@ -19,15 +28,11 @@ import random
 from dotenv import load_dotenv
 from nutri import nutrition_api
 from diet_plan import DietPlanAPI
-from datetime import datetime
 import requests
 import atexit
 
 load_dotenv()
 
-chat_archives = {}
-current_chat = {}
-
 app = Flask(__name__)
 CORS(app)
 app.secret_key = 'your_secret_key_here'  # सत्र के लिए गुप्त कुंजी सेट करें
@@ -40,13 +45,36 @@ logger = logging.getLogger(__name__)
 # Define the static folder path
 STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
 
-patient_history = {}
-
 # Create the static folder if it doesn't exist
 if not os.path.exists(STATIC_FOLDER):
     os.makedirs(STATIC_FOLDER)
 
 chatbot = ChatBot()
+# 'sqlite' (default) shares state between gunicorn workers through sessions.db
+session_store = create_session_store(os.getenv("SESSION_STORE", "sqlite"))
+sessions = SessionManager(max_sessions=int(os.getenv("SESSION_MAX", 10000)),
+                          idle_ttl=int(os.getenv("SESSION_IDLE_TTL", 1800)),
+                          store=session_store,
+                          lease_ttl=int(os.getenv("SESSION_LEASE_TTL", 60)))
+# Archived chats live in archives.db, shared by every worker
+archives = ArchiveManager(memory_budget=int(os.getenv("ARCHIVE_MEMORY_MB", 64)) * 1024 * 1024,
+                          idle_ttl=int(os.getenv("ARCHIVE_IDLE_TTL", 3600)))
+# Keeps knowledge.db current; KNOWLEDGE_REFRESH_HOURS=0 leaves it to cron.
+# Started by the first request a worker serves, never on import, so
+# scripts and tests that import the app make no upstream calls.
+snapshot_refresher = SnapshotRefresher()
+
+
+@app.before_request
+def start_snapshot_refresher():
+    snapshot_refresher.start()
+
+
+def session_id():
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return session['sid']
+
 
 class ExerciseAPI:
     BASE_URL = "https://wger.de/api/v2"
@@ -97,84 +125,79 @@ async def get_exercise_info(self, query):
                 "X-RapidAPI-Host": "exercisedb.p.rapidapi.com"
             }
 
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers) as response:
-                    exercises = await response.json()
-                    logger.debug(f"Exercises data received: {exercises}")
+            async with http_client.get(url, headers=headers) as response:
+                exercises = await response.json()
+                logger.debug(f"Exercises data received: {exercises}")
 
-                    if not exercises:
-                        return f"Sorry, I couldn't find any information about '{query}'. Please try another exercise."
+                if not exercises:
+                    return f"Sorry, I couldn't find any information about '{query}'. Please try another exercise."
 
-                    # Get the first (most relevant) result
-                    exercise = exercises[0]
+                # Get the first (most relevant) result
+                exercise = exercises[0]
 
-                    info = f"Exercise: {exercise['name']}\n\n"
-                    info += f"Type: {exercise['type']}\n\n"
-                    info += f"Body Part: {exercise['bodyPart']}\n\n"
-                    info += f"Equipment: {exercise['equipment']}\n\n"
-                    info += f"Target Muscle: {exercise['target']}\n\n"
-                    if exercise.get('instructions'):
-                        info += "Instructions:\n"
-                        for i, step in enumerate(exercise['instructions'], 1):
-                            info += f"{i}. {step}\n"
+                info = f"Exercise: {exercise['name']}\n\n"
+                info += f"Type: {exercise['type']}\n\n"
+                info += f"Body Part: {exercise['bodyPart']}\n\n"
+                info += f"Equipment: {exercise['equipment']}\n\n"
+                info += f"Target Muscle: {exercise['target']}\n\n"
+                if exercise.get('instructions'):
+                    info += "Instructions:\n"
+                    for i, step in enumerate(exercise['instructions'], 1):
+                        info += f"{i}. {step}\n"
 
-                    logger.debug(f"Formatted exercise info:\n{info}")
-                    return info
+                logger.debug(f"Formatted exercise info:\n{info}")
+                return info
 
         except Exception as e:
             logger.error(f"An error occurred: {str(e)}")
             return f"Sorry, an error occurred while fetching information about '{query}'. Please try again later."
 async def get_disease_info(disease_name):
-    async with aiohttp.ClientSession() as session:
-        api = MedlinePlusAPI(session)
-        return await api.get_disease_info(disease_name)
+    # A connection is only opened when the cache cannot answer
+    return await MedlinePlusAPI().get_disease_info(disease_name)
 
 async def get_drug_info(drug_name):
-    async with aiohttp.ClientSession() as session:
-        api = OpenFDAAPI(session)
-        return await api.get_drug_info(drug_name)    
+    return await OpenFDAAPI().get_drug_info(drug_name)
 
 async def get_medicines_for_disease(disease_name):
-    async with aiohttp.ClientSession() as session:
-        api = MedicationAPI(session)
-        medicines = await api.get_medicines_for_disease(disease_name)
-        logger.debug(f"Medicines returned from API: {medicines}")
-        if medicines:
-            formatted_info = f"<h2>Medicines for {disease_name}</h2>"
-            for medicine in medicines:
-                name_to_display = medicine['name'] if medicine['name'] != 'N/A' else medicine['generic_name']
-                if name_to_display == 'N/A':
-                    name_to_display = "Unknown Medicine"
-                
-                formatted_info += f"""
-                <div class="medicine-info">
-                    <h3>{name_to_display}</h3>
-                """
-                
-                if medicine['name'] != 'N/A' and medicine['name'] != medicine['generic_name']:
-                    formatted_info += f"<p><strong>Brand Name:</strong> {medicine['name']}</p>"
-                
-                if medicine['generic_name'] != 'N/A':
-                    formatted_info += f"<p><strong>Generic Name:</strong> {medicine['generic_name']}</p>"
-                
-                if medicine['description'] != 'N/A':
-                    formatted_info += f"<h4>Description:</h4><p>{medicine['description']}</p>"
-                
-                for field in ['indications', 'dosage', 'precautions']:
-                    if medicine[field] and medicine[field] != 'N/A':
-                        formatted_info += f"""
-                        <h4>{field.capitalize()}:</h4>
-                        <ul>
-                            {format_bullet_points(medicine[field])}
-                        </ul>
-                        """
-                
-                formatted_info += "</div><hr>"
+    api = MedicationAPI()
+    medicines = await api.get_medicines_for_disease(disease_name)
+    logger.debug(f"Medicines returned from API: {medicines}")
+    if medicines:
+        formatted_info = f"<h2>Medicines for {disease_name}</h2>"
+        for medicine in medicines:
+            name_to_display = medicine['name'] if medicine['name'] != 'N/A' else medicine['generic_name']
+            if name_to_display == 'N/A':
+                name_to_display = "Unknown Medicine"
+            
+            formatted_info += f"""
+            <div class="medicine-info">
+                <h3>{name_to_display}</h3>
+            """
+            
+            if medicine['name'] != 'N/A' and medicine['name'] != medicine['generic_name']:
+                formatted_info += f"<p><strong>Brand Name:</strong> {medicine['name']}</p>"
+            
+            if medicine['generic_name'] != 'N/A':
+                formatted_info += f"<p><strong>Generic Name:</strong> {medicine['generic_name']}</p>"
+            
+            if medicine['description'] != 'N/A':
+                formatted_info += f"<h4>Description:</h4><p>{medicine['description']}</p>"
+            
+            for field in ['indications', 'dosage', 'precautions']:
+                if medicine[field] and medicine[field] != 'N/A':
+                    formatted_info += f"""
+                    <h4>{field.capitalize()}:</h4>
+                    <ul>
+                        {format_bullet_points(medicine[field])}
+                    </ul>
+                    """
             
-            logger.debug(f"Formatted info: {formatted_info}")
-            return formatted_info
-        logger.warning(f"No medicines found for disease: {disease_name}")
-        return f"<p>No specific medicine information found for {disease_name}. Please consult with a healthcare professional for accurate medical advice.</p>"
+            formatted_info += "</div><hr>"
+        
+        logger.debug(f"Formatted info: {formatted_info}")
+        return formatted_info
+    logger.warning(f"No medicines found for disease: {disease_name}")
+    return f"<p>No specific medicine information found for {disease_name}. Please consult with a healthcare professional for accurate medical advice.</p>"
 
 def format_bullet_points(text):
     # Split the text into sentences
@@ -249,9 +272,22 @@ def home():
 
 @app.route('/get_response', methods=['POST'])
 async def get_response():
+    conversation = sessions.get(session_id())
+    # Turns of one conversation are handled one at a time
+    async with conversation.lock:
+        bot = chatbot.for_session(sessions.load(conversation))
+        try:
+            # Upstream calls for this turn share one end-to-end deadline
+            with request_deadline():
+                return await handle_turn(bot)
+        finally:
+            sessions.save(conversation)
+
+
+async def handle_turn(bot):
     try:
         start_time = time.time()
-        await chatbot.initialize()  # Ensure the API session is open
+        await bot.initialize()  # Ensure the API session is open
         
         data = request.json
         user_input = data['input']
@@ -262,7 +298,7 @@ async def get_response():
         
         if is_new_chat:
             # Reset the chatbot state for new chat
-            chatbot.reset()
+            bot.reset()
             return jsonify({
                 "message": "How can I assist you today?",
                 "showActionButtons": True,
@@ -275,7 +311,7 @@ async def get_response():
         
         if is_action_choice:
             # Handle primary choice selection
-            chatbot.primary_choice = user_input
+            bot.primary_choice = user_input
             if user_input == "1":
                 return jsonify({
                     "message": "Type 1 to start your diagnosis",
@@ -314,7 +350,7 @@ async def get_response():
             query = user_input[13:].strip()  # Extract the exercise name
             print(f"DEBUG: About to call get_exercise_info with query: '{query}'")
             try:
-                exercise_info = await chatbot.get_exercise_info(query)
+                exercise_info = await bot.get_exercise_info(query)
                 print("DEBUG: Exercise info received:")
                 print(exercise_info)
             except Exception as e:
@@ -331,7 +367,7 @@ async def get_response():
             target = user_input[15:].strip()
             logger.debug(f"About to call get_fitness_routine with target: '{target}'")
             try:
-                fitness_routine = await chatbot.get_fitness_routine(target)
+                fitness_routine = await bot.get_fitness_routine(target)
                 logger.debug(f"Fitness routine received: {fitness_routine}")
                 
                 if fitness_routine and isinstance(fitness_routine, dict):
@@ -359,7 +395,7 @@ async def get_response():
         elif user_input.lower().startswith("nutrition info"):
             query = user_input[14:].strip()
             print(f"Fetching nutrition info for query: {query}")
-            nutrition_info = await chatbot.get_nutrition_info(query)
+            nutrition_info = await bot.get_nutrition_info(query)
             
             if nutrition_info:
                 return jsonify({
@@ -391,16 +427,16 @@ async def get_response():
         elif user_input.lower().startswith("tell me about"):
             query = user_input[14:].strip()
             print(f"Fetching info for query: {query}")
-            disease_info = await get_disease_info(query)
-            drug_info = await get_drug_info(query)
+            # Local content first; otherwise both sources are asked at once
+            # and the disease summary wins when present
+            info_type, info = knowledge_index.resolve(query)
+            if info_type is None:
+                info_type, info = await first_preferred([
+                    ("disease", get_disease_info(query), has_disease_info),
+                    ("drug", get_drug_info(query), lambda drug_info: drug_info is not None),
+                ])
             
-            if disease_info:
-                info = disease_info
-                info_type = "disease"
-            elif drug_info:
-                info = drug_info
-                info_type = "drug"
-            else:
+            if info_type is None:
                 info = f"I'm sorry, but I couldn't find any information about {query}."
                 info_type = "unknown"
             
@@ -411,7 +447,7 @@ async def get_response():
                 "infoType": info_type
             })
         else:
-            response = await chatbot.process_input(user_input, symptoms=symptoms)
+            response = await bot.process_input(user_input, symptoms=symptoms)
         
         if isinstance(response, list):
             # If it's a list of responses, combine them
@@ -433,10 +469,10 @@ async def get_response():
         else:
             response_data = {
                 "message": str(response),
-                "symptoms": chatbot.current_symptoms,
-                "primaryChoice": chatbot.primary_choice,
-                "state": chatbot.state,
-                "showActionButtons": chatbot.state == "choose_action",
+                "symptoms": bot.current_symptoms,
+                "primaryChoice": bot.primary_choice,
+                "state": bot.state,
+                "showActionButtons": bot.state == "choose_action",
                 "isDiagnosis": False
             }
 
@@ -458,6 +494,45 @@ async def get_response():
         return jsonify({"error": str(e)}), 500
 
 
+MAX_BATCH_SIZE = 10000
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    try:
+        data = request.json or {}
+        symptom_sets = data.get('symptomSets')
+
+        if not isinstance(symptom_sets, list) or not symptom_sets:
+            return jsonify({"error": "symptomSets must be a non-empty list of symptom lists"}), 400
+        if len(symptom_sets) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"At most {MAX_BATCH_SIZE} symptom sets can be scored per request"}), 413
+        if not all(isinstance(symptoms, list) and all(isinstance(sym, str) for sym in symptoms) for symptoms in symptom_sets):
+            return jsonify({"error": "Each symptom set must be a list of symptom names"}), 400
+
+        start_time = time.time()
+        results = chatbot.predict_batch(symptom_sets)
+        print(f"Scored {len(results)} symptom sets in {time.time() - start_time:.3f} seconds")
+        return jsonify({"results": results})
+    except Exception as e:
+        print(f"Error in predict_batch: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        "historyWriter": chatbot.history_writer.stats(),
+        "sessions": sessions.stats(),
+        "archives": archives.stats(),
+        "caches": {name: cache.stats() for name, cache in CACHES.items()},
+        "drugIds": drug_ids.stats(),
+        "httpClient": http_client.stats(),
+        "knowledge": knowledge.stats(),
+        "searchIndex": knowledge_index.stats()
+    })
+
+
 @app.route('/check_refresh', methods=['GET'])
 def check_refresh():
     needs_refresh = session.pop('needs_refresh', False)
@@ -467,9 +542,8 @@ def check_refresh():
 async def test_api():
     query = request.args.get('query', 'diabetes')
     
-    async with aiohttp.ClientSession() as session:
-        disease_info = await get_disease_info(query)
-        drug_info = await get_drug_info(query)
+    disease_info = await get_disease_info(query)
+    drug_info = await get_drug_info(query)
     
     return jsonify({
         "query": query, 
@@ -488,11 +562,10 @@ async def test_exercise_api():
         "X-RapidAPI-Host": "exercisedb.p.rapidapi.com"
     }
 
-    async with aiohttp.ClientSession() as session:
-        logger.debug(f"Fetching exercise data from URL: {url}")
-        async with session.get(url, headers=headers) as response:
-            exercise_data = await response.json()
-            logger.debug(f"Exercise data received: {exercise_data}")
+    logger.debug(f"Fetching exercise data from URL: {url}")
+    async with http_client.get(url, headers=headers) as response:
+        exercise_data = await response.json()
+        logger.debug(f"Exercise data received: {exercise_data}")
 
     if isinstance(exercise_data, list) and exercise_data:
         # Get the first (most relevant) result
@@ -521,45 +594,44 @@ async def test_fitness_routine():
     target = request.args.get('target', 'chest')  # Default to 'chest' if no target is provided
     logger.debug(f"Testing fitness routine API with target: {target}")
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            url = f"https://exercisedb.p.rapidapi.com/exercises/bodyPart/{target}"
-            headers = {
-                "X-RapidAPI-Key": os.getenv("RAPIDAPI_KEY"),
-                "X-RapidAPI-Host": "exercisedb.p.rapidapi.com"
-            }
+    try:
+        url = f"https://exercisedb.p.rapidapi.com/exercises/bodyPart/{target}"
+        headers = {
+            "X-RapidAPI-Key": os.getenv("RAPIDAPI_KEY"),
+            "X-RapidAPI-Host": "exercisedb.p.rapidapi.com"
+        }
 
-            async with session.get(url, headers=headers) as response:
-                exercises = await response.json()
-                logger.debug(f"Received {len(exercises)} exercises for {target}")
-
-                if exercises and isinstance(exercises, list):
-                    # Select 5 random exercises
-                    selected_exercises = random.sample(exercises, min(5, len(exercises)))
-                    
-                    routine = f"Fitness routine for {target}:\n\n"
-                    for i, exercise in enumerate(selected_exercises, 1):
-                        routine += f"{i}. {exercise['name']}\n"
-                        routine += f"   Sets: 3, Reps: 12\n"
-                        routine += f"   Equipment: {exercise['equipment']}\n\n"
-                    
-                    routine += "Perform each exercise for 3 sets of 12 repetitions. Rest for 60 seconds between sets."
+        async with http_client.get(url, headers=headers) as response:
+            exercises = await response.json()
+            logger.debug(f"Received {len(exercises)} exercises for {target}")
 
-                    return jsonify({
-                        "target": target,
-                        "routine": routine,
-                        "exercises": [ex['name'] for ex in selected_exercises]
-                    })
-                else:
-                    return jsonify({
-                        "error": f"No exercises found for target: {target}"
-                    }), 404
+            if exercises and isinstance(exercises, list):
+                # Select 5 random exercises
+                selected_exercises = random.sample(exercises, min(5, len(exercises)))
+                
+                routine = f"Fitness routine for {target}:\n\n"
+                for i, exercise in enumerate(selected_exercises, 1):
+                    routine += f"{i}. {exercise['name']}\n"
+                    routine += f"   Sets: 3, Reps: 12\n"
+                    routine += f"   Equipment: {exercise['equipment']}\n\n"
+                
+                routine += "Perform each exercise for 3 sets of 12 repetitions. Rest for 60 seconds between sets."
 
-        except Exception as e:
-            logger.error(f"An error occurred while fetching fitness routine: {str(e)}")
-            return jsonify({
-                "error": f"An error occurred: {str(e)}"
-            }), 500
+                return jsonify({
+                    "target": target,
+                    "routine": routine,
+                    "exercises": [ex['name'] for ex in selected_exercises]
+                })
+            else:
+                return jsonify({
+                    "error": f"No exercises found for target: {target}"
+                }), 404
+
+    except Exception as e:
+        logger.error(f"An error occurred while fetching fitness routine: {str(e)}")
+        return jsonify({
+            "error": f"An error occurred: {str(e)}"
+        }), 500
 
 @app.route('/test_nutrition_api', methods=['GET'])
 async def test_nutrition_api():
@@ -635,7 +707,10 @@ async def test_diet_plan_api():
 @app.route('/reset_conversation', methods=['POST'])
 def reset_conversation():
     try:
-        chatbot.reset()
+        conversation = sessions.get(session_id())
+        with conversation.lock:
+            sessions.load(conversation).reset()
+            sessions.save(conversation)
 
         session.pop('chat_history', None)
         session.pop('current_symptoms', None)
@@ -644,8 +719,8 @@ def reset_conversation():
         
         
         user_id = session.get('user_id', 'anonymous')
-        if user_id in chat_archives:
-            chat_archives[user_id].append({'timestamp': datetime.now().isoformat(), 'history': []})
+        if archives.has_user(user_id):
+            archives.add(user_id, [])
         return jsonify({"message": "Conversation reset successfully"}), 200
     except Exception as e:
         print(f"Error resetting conversation: {e}")
@@ -653,15 +728,7 @@ def reset_conversation():
 
 def save_current_conversation():
     user_id = session.get('user_id', 'anonymous')
-    timestamp = datetime.now().isoformat()
-    
-    if user_id not in chat_archives:
-        chat_archives[user_id] = []
-    
-    chat_archives[user_id].append({
-        'timestamp': timestamp,
-        'history': session['chat_history']
-    })    
+    archives.add(user_id, session['chat_history'])
 @app.route('/start_new_chat', methods=['POST'])
 def start_new_chat():
     try:
@@ -669,33 +736,34 @@ def start_new_chat():
         print(f"Starting new chat for user: {user_id}")  # Add this line for debugging
         
         # Save current chat to archives if it exists
-        if user_id in current_chat and current_chat[user_id]:
-            if user_id not in chat_archives:
-                chat_archives[user_id] = []
-            chat_archives[user_id].append({
-                'timestamp': datetime.now().isoformat(),
-                'history': current_chat[user_id]
-            })
-            print(f"Saved current chat to archives. Total chats: {len(chat_archives[user_id])}")  # Add this line for debugging
+        chat = session_store.get(f"current_chat:{user_id}")
+        if chat and isinstance(chat, list):
+            archives.add(user_id, chat)
+            print(f"Saved current chat to archives. Total chats: {len(archives.list(user_id))}")  # Add this line for debugging
         
         # Clear current chat
-        current_chat[user_id] = []
+        session_store.delete(f"current_chat:{user_id}")
         
         print("New chat started successfully")  # Add this line for debugging
         return jsonify({"message": "New chat started successfully"}), 200
     except Exception as e:
         print(f"Error starting new chat: {e}")
         return jsonify({"error": str(e)}), 500
+def posted_history():
+    # The chat history a client sent, or None unless it is a list of messages
+    data = request.get_json(silent=True)
+    history = data.get('history') if isinstance(data, dict) else None
+    return history if isinstance(history, list) else None
+
 @app.route('/auto_save_chat_history', methods=['POST'])
 def auto_save_chat_history():
     try:
-        data = request.json
+        history = posted_history()
+        if history is None:
+            return jsonify({"error": "history must be a list of messages"}), 400
         user_id = session.get('user_id', 'anonymous')
         
-        if user_id not in current_chat:
-            current_chat[user_id] = []
-        
-        current_chat[user_id] = data['history']
+        session_store.put(f"current_chat:{user_id}", history)
         
         return jsonify({"message": "Chat history auto-saved successfully"}), 200
     except Exception as e:
@@ -705,17 +773,11 @@ def auto_save_chat_history():
 @app.route('/save_chat_history', methods=['POST'])
 def save_chat_history():
     try:
-        data = request.json
+        history = posted_history()
+        if history is None:
+            return jsonify({"error": "history must be a list of messages"}), 400
         user_id = session.get('user_id', 'anonymous')
-        timestamp = datetime.now().isoformat()
-        
-        if user_id not in chat_archives:
-            chat_archives[user_id] = []
-        
-        chat_archives[user_id].append({
-            'timestamp': timestamp,
-            'history': data['history']
-        })
+        archives.add(user_id, history)
         
         return jsonify({"message": "Chat history saved successfully"}), 200
     except Exception as e:
@@ -725,17 +787,15 @@ def save_chat_history():
 @app.route('/get_archived_chats', methods=['GET'])
 def get_archived_chats():
     user_id = session.get('user_id', 'anonymous')
-    chats = chat_archives.get(user_id, [])
-    return jsonify([{'id': i+1, 'timestamp': chat['timestamp']} for i, chat in enumerate(chats)])
+    return jsonify(archives.list(user_id))
 
 @app.route('/get_archived_chat/<chat_id>', methods=['GET'])
 def get_archived_chat(chat_id):
     user_id = session.get('user_id', 'anonymous')
-    chats = chat_archives.get(user_id, [])
     try:
-        chat_id = int(chat_id)
-        if 1 <= chat_id <= len(chats):
-            return jsonify(chats[chat_id-1]['history'])
+        history = archives.get(user_id, int(chat_id))
+        if history is not None:
+            return jsonify(history)
     except ValueError:
         pass
     return jsonify({"error": "Chat not found"}), 404
@@ -744,11 +804,8 @@ def get_archived_chat(chat_id):
 @app.route('/get_chat_history', methods=['GET'])
 def get_chat_history():
     user_id = session.get('user_id', 'anonymous')
-    chats = chat_archives.get(user_id, [])
-    return jsonify([{
-        'timestamp': chat['timestamp'],
-        'messages': chat['history'][:2]  # Only send the first two messages for preview
-    } for chat in chats])
+    # Only the first two messages of each chat are sent as a preview
+    return jsonify(archives.previews(user_id))
 
 @app.route('/speech_to_text', methods=['POST'])
 def speech_to_text():
@@ -820,29 +877,30 @@ def send_static(path):
 
 @app.route('/get_patient_history', methods=['GET'])
 def get_patient_history():
-    return jsonify(patient_history)
+    return jsonify(dict(session_store.items("patient:")))
 
 @app.route('/add_patient', methods=['POST'])
 def add_patient():
     data = request.json
     patient_name = data['name']
-    if patient_name not in patient_history:
-        patient_history[patient_name] = {'name': patient_name, 'age': None, 'gender': None, 'symptoms': []}
+    if session_store.get(f"patient:{patient_name}") is None:
+        session_store.put(f"patient:{patient_name}", {'name': patient_name, 'age': None, 'gender': None, 'symptoms': []})
     return jsonify({"message": "Patient added successfully"})
 
 @app.route('/update_patient', methods=['POST'])
 def update_patient():
     data = request.json
     patient_name = data['name']
-    if patient_name in patient_history:
-        patient_history[patient_name].update(data)
+    patient = session_store.get(f"patient:{patient_name}")
+    if patient is not None:
+        patient.update(data)
+        session_store.put(f"patient:{patient_name}", patient)
         return jsonify({"message": "Patient updated successfully"})
     return jsonify({"error": "Patient not found"})
 
 @app.route('/clear_patient_history', methods=['POST'])
 def clear_patient_history():
-    global patient_history
-    patient_history = {}
+    session_store.delete_prefix("patient:")
     return jsonify({"message": "Patient history cleared successfully"})
 
 if __name__ == '__main__':
@@ -0,0 +1,134 @@
+import gzip
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from database import Database
+
+ARCHIVE_DB = 'archives.db'
+
+
+class ArchiveManager:
+    # Archived chats per user in a SQLite table every worker process shares,
+    # so a chat archived by one worker is listed and served by any other.
+    # Chats are addressed by their row id, which never changes. Histories
+    # are stored gzipped; the most recently read ones stay decompressed in
+    # memory within `memory_budget` until idle past the TTL.
+    def __init__(self, db_name=ARCHIVE_DB, memory_budget=64 * 1024 * 1024, idle_ttl=3600):
+        self.db = Database(db_name)
+        self.memory_budget = memory_budget
+        self.idle_ttl = idle_ttl
+
+        # Row id -> (payload, last access), least recently used first
+        self._resident = OrderedDict()
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+
+        self.page_ins = 0
+        self.evictions = 0
+        connection = self.db.get_connection()
+        with connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS chat_archives (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                               'user_id TEXT NOT NULL, timestamp TEXT NOT NULL, preview TEXT NOT NULL, '
+                               'payload BLOB NOT NULL, size INTEGER NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS idx_chat_archives_user ON chat_archives (user_id, id)')
+            # Running totals for stats(), kept in step with every insert
+            connection.execute('CREATE TABLE IF NOT EXISTS chat_archive_totals (id INTEGER PRIMARY KEY CHECK (id = 0), '
+                               'users INTEGER NOT NULL, archives INTEGER NOT NULL, stored_bytes INTEGER NOT NULL)')
+            connection.execute('INSERT OR IGNORE INTO chat_archive_totals (id, users, archives, stored_bytes) '
+                               'SELECT 0, COUNT(DISTINCT user_id), COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) '
+                               'FROM chat_archives')
+
+    def _cache(self, archive_id, payload):
+        if archive_id in self._resident:
+            self._resident_bytes -= len(self._resident.pop(archive_id)[0])
+        self._resident[archive_id] = (payload, time.monotonic())
+        self._resident_bytes += len(payload)
+        self._enforce()
+
+    def _forget(self, archive_id):
+        if archive_id in self._resident:
+            self._resident_bytes -= len(self._resident.pop(archive_id)[0])
+
+    def _enforce(self):
+        now = time.monotonic()
+        while self._resident:
+            archive_id, (payload, last_access) = next(iter(self._resident.items()))
+            if self._resident_bytes > self.memory_budget or now - last_access > self.idle_ttl:
+                self._forget(archive_id)
+                self.evictions += 1
+            else:
+                break
+
+    def add(self, user_id, history, timestamp=None):
+        # Returns the id of the new archive
+        payload = json.dumps(history).encode('utf-8')
+        compressed = gzip.compress(payload, compresslevel=6)
+        connection = self.db.get_connection()
+        with connection:
+            cursor = connection.execute(
+                'INSERT INTO chat_archives (user_id, timestamp, preview, payload, size) VALUES (?, ?, ?, ?, ?)',
+                (user_id, timestamp or datetime.now().isoformat(), json.dumps(history[:2]), compressed, len(payload)))
+            # Counted after the insert, while this transaction holds the write lock
+            new_user = connection.execute('SELECT COUNT(*) FROM (SELECT 1 FROM chat_archives WHERE user_id = ? LIMIT 2)',
+                                          (user_id,)).fetchone()[0] == 1
+            connection.execute('UPDATE chat_archive_totals SET users = users + ?, archives = archives + 1, '
+                               'stored_bytes = stored_bytes + ? WHERE id = 0', (int(new_user), len(compressed)))
+        archive_id = cursor.lastrowid
+        with self._lock:
+            self._cache(archive_id, payload)
+        return archive_id
+
+    def has_user(self, user_id):
+        return self.db.get_connection().execute(
+            'SELECT 1 FROM chat_archives WHERE user_id = ? LIMIT 1', (user_id,)).fetchone() is not None
+
+    def list(self, user_id):
+        rows = self.db.get_connection().execute(
+            'SELECT id, timestamp FROM chat_archives WHERE user_id = ? ORDER BY id', (user_id,))
+        return [{'id': archive_id, 'timestamp': timestamp} for archive_id, timestamp in rows]
+
+    def previews(self, user_id):
+        rows = self.db.get_connection().execute(
+            'SELECT id, timestamp, preview FROM chat_archives WHERE user_id = ? ORDER BY id', (user_id,))
+        return [{'id': archive_id, 'timestamp': timestamp, 'messages': json.loads(preview)}
+                for archive_id, timestamp, preview in rows]
+
+    def get(self, user_id, archive_id):
+        connection = self.db.get_connection()
+        # The owner is checked on every read, cached or not
+        if connection.execute('SELECT 1 FROM chat_archives WHERE id = ? AND user_id = ?',
+                              (archive_id, user_id)).fetchone() is None:
+            return None
+        with self._lock:
+            cached = self._resident.get(archive_id)
+            if cached is not None:
+                self._cache(archive_id, cached[0])
+                return json.loads(cached[0])
+        payload = gzip.decompress(connection.execute('SELECT payload FROM chat_archives WHERE id = ?',
+                                                     (archive_id,)).fetchone()[0])
+        with self._lock:
+            self.page_ins += 1
+            self._cache(archive_id, payload)
+        return json.loads(payload)
+
+    def stats(self):
+        users, archives, stored_bytes = self.db.get_connection().execute(
+            'SELECT users, archives, stored_bytes FROM chat_archive_totals WHERE id = 0').fetchone()
+        with self._lock:
+            self._enforce()
+            return {
+                "users": users,
+                "archives": archives,
+                "storedBytes": stored_bytes,
+                "residentArchives": len(self._resident),
+                "residentBytes": self._resident_bytes,
+                "memoryBudget": self.memory_budget,
+                "pageIns": self.page_ins,
+                "evictions": self.evictions,
+            }
+
+    def close(self):
+        self.db.close()
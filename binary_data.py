@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BIN_DIR = 'Data/bin'
+FORMAT_VERSION = 1
+DATASETS = {
+    'training': 'Data/Training.csv',
+    'testing': 'Data/Testing.csv',
+}
+
+
+class Dataset:
+    def __init__(self, columns, x, classes, codes):
+        self.columns = list(columns)
+        self.x = x
+        self.classes = classes
+        self.codes = codes
+
+    @property
+    def y(self):
+        return self.classes[self.codes]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _source_stat(path):
+    stat = os.stat(path)
+    return {'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns}
+
+
+def _replace_file(path, write, mode='wb'):
+    # Readers see either the old file or the complete new one
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, mode) as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def _write_manifest(manifest_path, manifest):
+    _replace_file(manifest_path, lambda f: json.dump(manifest, f), mode='w')
+
+
+def _paths(name, bin_dir):
+    return (os.path.join(bin_dir, f"{name}.symptoms.bits.npy"),
+            os.path.join(bin_dir, f"{name}.labels.npy"),
+            os.path.join(bin_dir, f"{name}.manifest.json"))
+
+
+def read_csv_dataset(csv_path):
+    import pandas as pd
+    frame = pd.read_csv(csv_path)
+    x = frame.iloc[:, :-1]
+    classes, codes = np.unique(frame.iloc[:, -1].astype(str).values, return_inverse=True)
+    return Dataset(x.columns, x.values.astype(np.uint8), classes, codes.astype(np.int16))
+
+
+def build(name, csv_path=None, bin_dir=BIN_DIR):
+    csv_path = csv_path or DATASETS[name]
+    # Taken before the read, so an edit during the build shows up as stale
+    source_stat = _source_stat(csv_path)
+    source_sha256 = file_sha256(csv_path)
+    dataset = read_csv_dataset(csv_path)
+    bits_path, labels_path, manifest_path = _paths(name, bin_dir)
+    os.makedirs(bin_dir, exist_ok=True)
+
+    # 132 symptom flags pack into 17 bytes per row
+    _replace_file(bits_path, lambda f: np.save(f, np.packbits(dataset.x, axis=1)))
+    _replace_file(labels_path, lambda f: np.save(f, dataset.codes))
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'source': csv_path,
+        'source_sha256': source_sha256,
+        **source_stat,
+        'rows': int(dataset.x.shape[0]),
+        'columns': dataset.columns,
+        'classes': dataset.classes.tolist(),
+    }
+    # The manifest is written last, so a partial build is never seen as fresh
+    _write_manifest(manifest_path, manifest)
+    logger.info(f"Built {bits_path} ({os.path.getsize(bits_path)} bytes) from {csv_path}")
+    return dataset
+
+
+def load_manifest(name, bin_dir=BIN_DIR):
+    manifest_path = _paths(name, bin_dir)[2]
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def is_stale(name, csv_path=None, bin_dir=BIN_DIR):
+    csv_path = csv_path or DATASETS[name]
+    manifest = load_manifest(name, bin_dir)
+    if manifest is None or manifest.get('format_version') != FORMAT_VERSION:
+        return True
+    if not all(os.path.exists(path) for path in _paths(name, bin_dir)[:2]):
+        return True
+    if not os.path.exists(csv_path):
+        return False
+    # Size and mtime settle the common case; the CSV is only hashed when
+    # they moved, e.g. after a checkout that left the content alone
+    source_stat = _source_stat(csv_path)
+    if all(manifest.get(key) == value for key, value in source_stat.items()):
+        return False
+    if manifest.get('source_size', source_stat['source_size']) != source_stat['source_size']:
+        return True
+    if manifest['source_sha256'] != file_sha256(csv_path):
+        return True
+    manifest.update(source_stat)
+    _write_manifest(_paths(name, bin_dir)[2], manifest)
+    return False
+
+
+def load(name, csv_path=None, bin_dir=BIN_DIR, rebuild=True):
+    csv_path = csv_path or DATASETS[name]
+    if is_stale(name, csv_path, bin_dir):
+        logger.warning(f"Binary data for '{name}' is missing or stale, reading {csv_path}")
+        return build(name, csv_path, bin_dir) if rebuild else read_csv_dataset(csv_path)
+
+    start_time = time.time()
+    bits_path, labels_path, _ = _paths(name, bin_dir)
+    manifest = load_manifest(name, bin_dir)
+    bits = np.load(bits_path, mmap_mode='r')
+    codes = np.load(labels_path, mmap_mode='r')
+    x = np.unpackbits(bits, axis=1, count=len(manifest['columns']))
+    dataset = Dataset(manifest['columns'], x, np.array(manifest['classes']), codes)
+    logger.debug(f"Loaded binary data for '{name}' in {time.time() - start_time:.4f} seconds")
+    return dataset
+
+
+def compact(x, codes):
+    # Collapse identical (symptoms, prognosis) rows into one weighted row
+    rows = np.column_stack([np.asarray(x, dtype=np.int16), np.asarray(codes, dtype=np.int16)])
+    unique_rows, weights = np.unique(rows, axis=0, return_counts=True)
+    return unique_rows[:, :-1].astype(np.uint8), unique_rows[:, -1].astype(np.int16), weights.astype(np.float64)
+
+
+def compaction_report():
+    from sklearn.model_selection import train_test_split
+    from sklearn.tree import DecisionTreeClassifier
+
+    training = load('training')
+    testing = load('testing')
+    test_y = testing.y
+    x_train, _, y_train, _ = train_test_split(training.x, training.codes, test_size=0.3, random_state=20)
+    x_compact, y_compact, weights = compact(x_train, y_train)
+
+    def fit(x, y, sample_weight=None, repeat=20):
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            clf = DecisionTreeClassifier(random_state=0).fit(x, y, sample_weight=sample_weight)
+        return clf, (time.perf_counter() - start_time) / repeat
+
+    full_clf, full_time = fit(x_train, y_train)
+    compact_clf, compact_time = fit(x_compact, y_compact, weights)
+    full_acc = (training.classes[full_clf.predict(testing.x)] == test_y).mean()
+    compact_acc = (training.classes[compact_clf.predict(testing.x)] == test_y).mean()
+
+    print(f"Rows: {len(x_train)} -> {len(x_compact)} ({len(x_train) / len(x_compact):.1f}x compression)")
+    print(f"Training matrix: {x_train.nbytes} -> {x_compact.nbytes + weights.nbytes} bytes")
+    print(f"Fit time: {full_time * 1e3:.2f} ms -> {compact_time * 1e3:.2f} ms")
+    print(f"Tree nodes: {full_clf.tree_.node_count} -> {compact_clf.tree_.node_count}")
+    print(f"Testing.csv accuracy: {full_acc:.4f} -> {compact_acc:.4f}")
+    assert compact_acc == full_acc, "Compaction changed accuracy on Testing.csv"
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    for name, csv_path in DATASETS.items():
+        build(name, csv_path)
+    if '--report' in sys.argv:
+        compaction_report()
@@ -0,0 +1,257 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = 'cache'
+
+# Every named cache, for /metrics
+CACHES = {}
+
+
+def normalize_key(text):
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', str(text).lower()).split())
+
+
+class BackgroundLoop:
+    # One event loop on a daemon thread for work that must outlive a request;
+    # Flask closes each async view's loop as soon as the view returns.
+    def __init__(self, name="background-loop"):
+        self.name = name
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True).start()
+            return self._loop
+
+    def submit(self, coro):
+        # Submitted work outlives the request, so it starts from an empty
+        # context instead of inheriting the caller's (and its deadline)
+        return contextvars.Context().run(asyncio.run_coroutine_threadsafe, coro, self.loop)
+
+
+background = BackgroundLoop()
+
+
+class FetchAbandoned(Exception):
+    # The caller running a shared fetch was cancelled; waiters fetch again
+    pass
+
+
+class TTLCache:
+    # Size-bounded LRU with separate TTLs for positive and negative results.
+    # Expired entries are still served for `stale_ttl` while one background
+    # refresh runs. An optional disk tier keeps entries across restarts.
+    def __init__(self, name, maxsize=1024, ttl=86400, negative_ttl=3600, stale_ttl=7 * 86400, disk_dir=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.coalesced = 0
+        CACHES[name] = self
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json")
+
+    def _entry(self, value, negative, stored_at):
+        fresh_until = stored_at + (self.negative_ttl if negative else self.ttl)
+        return [value, negative, stored_at, fresh_until, fresh_until + self.stale_ttl]
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_path(key)) as f:
+                record = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if record.get('key') != key:
+            return None
+        return self._entry(record['value'], record['negative'], record['stored_at'])
+
+    def _write_disk(self, key, entry):
+        path = self._disk_path(key)
+        try:
+            with open(f"{path}.tmp", 'w') as f:
+                json.dump({'key': key, 'value': entry[0], 'negative': entry[1], 'stored_at': entry[2]}, f)
+            os.replace(f"{path}.tmp", path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"Could not write {self.name} cache entry to disk: {e}")
+
+    def lookup(self, key):
+        # Returns (status, value) where status is 'fresh', 'stale' or 'miss'
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self.disk_dir:
+                entry = self._read_disk(key)
+                if entry is not None:
+                    self.disk_hits += 1
+                    self._store(key, entry)
+            if entry is None or now > entry[4]:
+                self.misses += 1
+                return 'miss', None
+            self._entries.move_to_end(key)
+            if entry[1]:
+                self.negative_hits += 1
+            if now <= entry[3]:
+                self.hits += 1
+                return 'fresh', entry[0]
+            self.stale_hits += 1
+            return 'stale', entry[0]
+
+    def put(self, key, value, negative=False):
+        entry = self._entry(value, negative, time.time())
+        with self._lock:
+            self._store(key, entry)
+        if self.disk_dir:
+            self._write_disk(key, entry)
+
+    def items(self):
+        # Positive entries that can still be served, from memory and disk
+        now = time.time()
+        entries = {}
+        if self.disk_dir:
+            for name in os.listdir(self.disk_dir):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(self.disk_dir, name)) as f:
+                        record = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    continue
+                entries[record['key']] = self._entry(record['value'], record['negative'], record['stored_at'])
+        with self._lock:
+            entries.update(self._entries)
+        return [(key, entry[0]) for key, entry in entries.items() if not entry[1] and now <= entry[4]]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            os.remove(self._disk_path(key))
+
+    async def _refresh(self, key, refresh, is_negative):
+        try:
+            value = await refresh()
+            self.put(key, value, negative=is_negative(value))
+            self.refreshes += 1
+        except Exception as e:
+            # The stale value keeps being served until the next attempt
+            self.refresh_errors += 1
+            logger.warning(f"Background refresh of {self.name} entry '{key}' failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def revalidate(self, key, refresh, is_negative):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        background.submit(self._refresh(key, refresh, is_negative))
+
+    async def get_or_fetch(self, key, fetch, refresh=None, is_negative=lambda value: value is None):
+        # `fetch` runs in the caller's loop; `refresh` must not depend on it,
+        # since it runs later on the background loop
+        status, value = self.lookup(key)
+        if status == 'fresh':
+            return value
+        if status == 'stale':
+            self.revalidate(key, refresh or fetch, is_negative)
+            return value
+        return await self._fetch_once(key, fetch, is_negative)
+
+    async def _fetch_once(self, key, fetch, is_negative):
+        # Single flight: concurrent misses for a key share one upstream call.
+        # Requests run on different threads and loops, hence a thread-safe
+        # future that each waiter wraps into its own loop. The wrapper is
+        # shielded so a cancelled waiter does not cancel the shared future.
+        while True:
+            with self._lock:
+                inflight = self._inflight.get(key)
+                leader = inflight is None
+                if leader:
+                    inflight = self._inflight[key] = concurrent.futures.Future()
+                else:
+                    self.coalesced += 1
+            if leader:
+                break
+            try:
+                return await asyncio.shield(asyncio.wrap_future(inflight))
+            except FetchAbandoned:
+                continue
+
+        try:
+            value = await fetch()
+            self.put(key, value, negative=is_negative(value))
+            if not inflight.done():
+                inflight.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            # Only this caller gave up; the others must not see it as theirs
+            if not inflight.done():
+                inflight.set_exception(FetchAbandoned())
+            raise
+        except BaseException as e:
+            if not inflight.done():
+                inflight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "staleHits": self.stale_hits,
+            "negativeHits": self.negative_hits,
+            "diskHits": self.disk_hits,
+            "misses": self.misses,
+            "hitRate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "evictions": self.evictions,
+            "refreshes": self.refreshes,
+            "refreshErrors": self.refresh_errors,
+        }
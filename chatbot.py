@@ -1,13 +1,8 @@
-import pandas as pd
 import numpy as np
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.model_selection import train_test_split
-import csv
 from datetime import datetime
-import json
 import os
-from api_integration import MedlinePlusAPI
-import aiohttp
+from api_integration import MedlinePlusAPI, has_disease_info
+from http_client import http_client
 import re
 from html import escape, unescape
 import nltk
@@ -21,11 +16,55 @@ from medication_api import MedicationAPI
 import time
 import random
 import logging
+import copy
+import threading
 from nutri import nutrition_api
+from model_store import model_store
+from history_log import HistoryLog, HistoryView
+from database import SQLiteHistory
+from history_writer import HistoryWriter
+from session_state import ConversationState, session_field
+from fanout import first_preferred
+from search_index import knowledge_index
 
 
 logger = logging.getLogger(__name__)
 
+# 'sqlite' (default) keeps history in history.db, 'jsonl' in history/
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "sqlite")
+# From this many rows sklearn's compiled tree walk beats FlatTree.predict_matrix
+SKLEARN_BATCH_ROWS = 2000
+
+_history_lock = threading.Lock()
+_history = None
+
+
+def shared_history(history_file):
+    # One history store and writer thread per process, however many
+    # ChatBots are created
+    global _history
+    with _history_lock:
+        if _history is None:
+            # The JSON file is only read once, to seed the store on first start
+            if HISTORY_BACKEND == "jsonl":
+                store = HistoryLog(legacy_file=history_file)
+            else:
+                store = SQLiteHistory(legacy_file=history_file)
+            store.load()
+            store.start()
+            _history = (store, HistoryWriter(store))
+        return _history
+
+
+def close_history():
+    global _history
+    with _history_lock:
+        if _history is not None:
+            store, writer = _history
+            _history = None
+            writer.close()
+            store.close()
+
 
 class ExerciseAPI:
     BASE_URL = "https://wger.de/api/v2"
@@ -44,23 +83,26 @@ class ExerciseAPI:
 
 
 class ChatBot:
+    # Per-conversation fields are read from and written to self.session
+    symptom = session_field('symptom')
+    days = session_field('days')
+    additional_symptoms = session_field('additional_symptoms')
+    related_symptoms = session_field('related_symptoms')
+    current_patient = session_field('current_patient')
+    current_symptoms = session_field('current_symptoms')
+    symptom_candidates = session_field('symptom_candidates')
+    diagnosis = session_field('diagnosis')
+    diagnosis_time = session_field('diagnosis_time')
+    state = session_field('state')
+    primary_choice = session_field('primary_choice')
+
     def __init__(self):
-        self.symptom = ""
-        self.days = 0
-        self.additional_symptoms = []
-        self.state = "ask_name"
-        self.conversation_history = []
-        self.current_patient = None
-        self.current_symptoms = []
-        self.diagnosis = None
-        self.diagnosis_time = None  # Add this line
+        self.session = ConversationState()
         self.history_file = 'conversation_history.json'
         self.load_data()
         self.load_history()
         self.history = []
-        self.api_session = None
-        self.state="initial"
-        self.primary_choice = None
+        self.api_session = http_client
         self.exercise_api = ExerciseAPI()
         
 
@@ -68,80 +110,37 @@ class ChatBot:
 
     def load_data(self):
         try:
-            self.training = pd.read_csv('Data/Training.csv')
-            self.testing = pd.read_csv('Data/Testing.csv')
-            self.x = self.training.iloc[:, :-1]
-            self.y = self.training.iloc[:, -1]
-            self.x_train, self.x_test, self.y_train, self.y_test = train_test_split(self.x, self.y, test_size=0.3, random_state=20)
-            self.clf = DecisionTreeClassifier()
-            self.clf.fit(self.x_train, self.y_train)
-            self.load_symptom_data()
-            print(f"Shape of self.x: {self.x.shape}")
-            print(f"Columns in self.x: {self.x.columns}")
+            self.model = model_store.load()
+            self.flat_tree = self.model.flat_tree
+            self.symptom_index = self.model.symptom_index
+            self.symptom_resolver = self.model.symptom_resolver
+            self.cooccurrence = self.model.cooccurrence
+            self.severity_dict = self.model.severity_dict
+            self.description_dict = self.model.description_dict
+            self.precaution_dict = self.model.precaution_dict
+            print(f"Loaded model with {len(self.symptom_index)} symptoms")
         except Exception as e:
             print(f"Error loading data: {e}")
             raise
 
-    def load_symptom_data(self):
-        self.severity_dict = {}
-        self.description_dict = {}
-        self.precaution_dict = {}
-
-        try:
-            with open('MasterData/symptom_severity.csv', encoding='utf-8') as csv_file:
-                csv_reader = csv.reader(csv_file, delimiter=',')
-                next(csv_reader)  # Skip header
-                for row in csv_reader:
-                    if len(row) >= 2:
-                        self.severity_dict[row[0]] = int(row[1])
-
-            with open('MasterData/symptom_description.csv', encoding='utf-8') as csv_file:
-                csv_reader = csv.reader(csv_file, delimiter=',')
-                next(csv_reader)  # Skip header
-                for row in csv_reader:
-                    if len(row) >= 2:
-                        self.description_dict[row[0]] = row[1]
-
-            with open('MasterData/symptom_precaution.csv', encoding='utf-8') as csv_file:
-                csv_reader = csv.reader(csv_file, delimiter=',')
-                next(csv_reader)  # Skip header
-                for row in csv_reader:
-                    if len(row) >= 5:
-                        self.precaution_dict[row[0]] = [row[1], row[2], row[3], row[4]]
-        except Exception as e:
-            print(f"Error loading symptom data: {e}")
-            raise
-
     def load_history(self):
-        if os.path.exists(self.history_file):
-            try:
-                with open(self.history_file, 'r') as f:
-                    self.conversation_history = json.load(f)
-                print("Loaded history:", self.conversation_history)  # Debug log
-            except json.JSONDecodeError as e:
-                print(f"Error decoding JSON in history file: {e}")
-                print("Initializing empty history due to corrupt file.")
-                self.conversation_history = {}
-                # Optionally, you can rename the corrupt file for later inspection
-                os.rename(self.history_file, f"{self.history_file}.corrupt")
-        else:
-            self.conversation_history = {}
-            print("No history file found, initialized empty history")  # Debug log
-
-    def save_history(self):
-        print("Saving history:", self.conversation_history)  # Debug log
-        with open(self.history_file, 'w') as f:
-            json.dump(self.conversation_history, f)
+        self.history_store, self.history_writer = shared_history(self.history_file)
+        # Nothing is read up front; reads wait for queued turns to be written
+        self.conversation_history = HistoryView(self.history_store, before_read=self.history_writer.flush)
 
     
     async def initialize(self):
-        if not self.api_session or self.api_session.closed:
-            self.api_session = aiohttp.ClientSession()
+        # Upstream calls share the process-wide connection pool
+        self.api_session = http_client
 
-    async def close(self):
-        if self.api_session and not self.api_session.closed:
+    def for_session(self, state):
+        # Shallow copy: the model, resolver and history store stay shared
+        bot = copy.copy(self)
+        bot.session = state
+        return bot
 
-            await self.api_session.close()   
+    async def close(self):
+        close_history()
 
 
     def create_html_page(self, content):
@@ -299,28 +298,29 @@ class ChatBot:
                 print(f"Fetching info for {disease_name} from MedlinePlus API")
                 info = await api.get_disease_info(disease_name)
                 print(f"Received info from API in {time.time() - start_time:.2f} seconds")
-
-                if info.startswith("Error"):
-                    return f"<p>{info}</p>"
-                elif info.startswith("Unable to fetch"):
-                    return f"<p>{info}</p>"
-                else:
-                    # Parse the information
-                    title, summary = info.split("\n", 1)
-                    title = title.replace("Title: ", "")
-                    summary = summary.replace("Summary: ", "")
-
-                    # Format the information as HTML
-                    formatted_info = f"""
-                        <h2>{title}</h2>
-                        <div>{summary}</div>
-                    """
-                    print(f"Formatted info in {time.time() - start_time:.2f} seconds")
-                    return formatted_info
+                return self.format_disease_info(info)
             except Exception as e:
                 print(f"Error in get_formatted_disease_info: {e}")
                 return f"<p>An error occurred while fetching information: {str(e)}</p>"
-            
+
+    def format_disease_info(self, info):
+        if info.startswith("Error"):
+            return f"<p>{info}</p>"
+        elif info.startswith("Unable to fetch"):
+            return f"<p>{info}</p>"
+        else:
+            # Parse the information
+            title, summary = info.split("\n", 1)
+            title = title.replace("Title: ", "")
+            summary = summary.replace("Summary: ", "")
+
+            # Format the information as HTML
+            formatted_info = f"""
+                <h2>{title}</h2>
+                <div>{summary}</div>
+            """
+            return formatted_info
+        
 
     async def get_formatted_drug_info(self, drug_name):
             start_time = time.time()
@@ -335,18 +335,38 @@ class ChatBot:
 
                 if info is None:
                     return f"I'm sorry, but I couldn't find any information about {drug_name} in the OpenFDA database."
-
-                formatted_info = f"Here's information about {drug_name}:\n\n"
-                formatted_info += f"Description: {info['description']}\n\n"
-                formatted_info += f"Indications and Usage: {info['indications_and_usage']}\n\n"
-                formatted_info += f"Warnings: {info['warnings']}\n\n"
-                formatted_info += f"Dosage and Administration: {info['dosage_and_administration']}"
-
-                return self.create_html_content(formatted_info)
+                return self.format_drug_info(drug_name, info)
             except Exception as e:
                 print(f"Error fetching drug info: {e}")
                 return f"I'm sorry, but I encountered an error while fetching information about {drug_name}. Please try again later."
 
+    def format_drug_info(self, drug_name, info):
+        formatted_info = f"Here's information about {drug_name}:\n\n"
+        formatted_info += f"Generic Name: {info['generic_name']}\n\n"
+        formatted_info += f"Indications and Usage: {info['indications_and_usage']}\n\n"
+        formatted_info += f"Warnings: {info['warnings']}\n\n"
+        formatted_info += f"Dosage and Administration: {info['dosage_and_administration']}"
+
+        return self.create_html_content(formatted_info)
+
+    async def lookup_info(self, query):
+        # Local content answers first. Otherwise MedlinePlus and OpenFDA are
+        # asked at once; a disease summary is preferred, so the drug label
+        # only matters when MedlinePlus has none
+        start_time = time.time()
+        source, info = knowledge_index.resolve(query)
+        if source is None:
+            source, info = await first_preferred([
+                ("disease", MedlinePlusAPI(self.api_session).get_disease_info(query), has_disease_info),
+                ("drug", OpenFDAAPI(self.api_session).get_drug_info(query), lambda info: info is not None),
+            ])
+        print(f"Looked up {query} ({source or 'no match'}) in {time.time() - start_time:.2f} seconds")
+        if source == "disease":
+            return self.format_disease_info(info)
+        if source == "drug":
+            return self.format_drug_info(query, info)
+        return None
+
     async def get_medicines_for_disease(self, disease_name):
         try:
             medicines = await self.medication_api.get_medicines_for_disease(disease_name)
@@ -415,35 +435,34 @@ class ChatBot:
             "X-RapidAPI-Host": "exercisedb.p.rapidapi.com"
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                exercises = await response.json()
-                logger.debug(f"Received {len(exercises)} exercises from API")
+        async with self.api_session.get(url, headers=headers) as response:
+            exercises = await response.json()
+            logger.debug(f"Received {len(exercises)} exercises from API")
 
-                if exercises and isinstance(exercises, list):
-                    selected_exercises = random.sample(exercises, min(5, len(exercises)))
-                    
-                    routine = f"Fitness routine for {target}:\n\n"
-                    exercise_names = []
-                    for i, exercise in enumerate(selected_exercises, 1):
-                        exercise_name = exercise['name']
-                        exercise_names.append(exercise_name)
-                        routine += f"{i}. {exercise_name}\n"
-                        routine += f"   Sets: 3, Reps: 12\n"
-                        routine += f"   Equipment: {exercise['equipment']}\n\n"
-                    
-                    routine += "Perform each exercise for 3 sets of 12 repetitions. Rest for 60 seconds between sets."
-                    
-                    result = {
-                        "routine": routine,
-                        "exercises": exercise_names,
-                        "target": target
-                    }
-                    logger.debug(f"Generated fitness routine: {result}")
-                    return result
-                else:
-                    logger.warning(f"No exercises found for target: {target}")
-                    return None   
+            if exercises and isinstance(exercises, list):
+                selected_exercises = random.sample(exercises, min(5, len(exercises)))
+                
+                routine = f"Fitness routine for {target}:\n\n"
+                exercise_names = []
+                for i, exercise in enumerate(selected_exercises, 1):
+                    exercise_name = exercise['name']
+                    exercise_names.append(exercise_name)
+                    routine += f"{i}. {exercise_name}\n"
+                    routine += f"   Sets: 3, Reps: 12\n"
+                    routine += f"   Equipment: {exercise['equipment']}\n\n"
+                
+                routine += "Perform each exercise for 3 sets of 12 repetitions. Rest for 60 seconds between sets."
+                
+                result = {
+                    "routine": routine,
+                    "exercises": exercise_names,
+                    "target": target
+                }
+                logger.debug(f"Generated fitness routine: {result}")
+                return result
+            else:
+                logger.warning(f"No exercises found for target: {target}")
+                return None   
     async def get_nutrition_info(self, query):
         nutrition_data = await nutrition_api.get_nutrition_info(query)
         if nutrition_data:
@@ -550,10 +569,23 @@ class ChatBot:
                 }
         elif self.state == "ask_symptom":
             self.symptom = user_input.lower().strip()
-            if self.symptom in self.x.columns:
+            # A number picks one of the candidates offered on the previous turn
+            if self.symptom.isdigit() and 1 <= int(self.symptom) <= len(self.symptom_candidates):
+                self.symptom = self.symptom_candidates[int(self.symptom) - 1]
+            matches = self.symptom_resolver.resolve(self.symptom)
+            resolved = self.symptom_resolver.pick(matches)
+            if resolved:
+                self.symptom = resolved
+                self.symptom_candidates = []
                 self.current_symptoms.append(self.symptom)
                 self.state = "ask_days"
                 response = f"For how many days have you been feeling {self.symptom}?"
+            elif matches:
+                self.symptom_candidates = [column for column, score in matches]
+                response = "Did you mean one of these symptoms?\n"
+                for i, column in enumerate(self.symptom_candidates, 1):
+                    response += f"{i}. {column}\n"
+                response += "Please reply with the number or the symptom name."
             else:
                 response = f"I'm sorry, but I don't have information about the symptom '{self.symptom}'. Please try another symptom."
         elif self.state == "ask_days":
@@ -598,13 +630,8 @@ class ChatBot:
         elif self.state == "ask_info":
             if user_input.lower().startswith("tell me about"):
                 query = user_input[14:].strip()
-                disease_info = await self.get_formatted_disease_info(query)
-                drug_info = await self.get_formatted_drug_info(query)
-                if disease_info.startswith("Here's information about"):
-                    response = disease_info
-                elif drug_info.startswith("Here's information about"):
-                    response = drug_info
-                else:
+                response = await self.lookup_info(query)
+                if response is None:
                     response = f"I'm sorry, but I couldn't find any information about {query}."
                 return self.conclude_info(response)
             else:
@@ -612,18 +639,14 @@ class ChatBot:
 
         # Save conversation history
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        if current_time not in self.conversation_history:
-            self.conversation_history[current_time] = []
-        
-        self.conversation_history[current_time].append({
+        entry = {
             "patient": self.current_patient,
             "symptoms": self.current_symptoms.copy(),
             "diagnosis": self.diagnosis,
             "diagnosis_time": self.diagnosis_time,
             "conversation": (user_input, response)
-        })
-        
-        await self.save_history()
+        }
+        await self.save_history(current_time, entry)
         
         return {
         "message": response,
@@ -676,38 +699,74 @@ class ChatBot:
             ]
         }
         
-    async def save_history(self):
-        with open(self.history_file, 'w') as f:
-            json.dump(self.conversation_history, f)
+    async def save_history(self, timestamp, entry):
+        # Queued for the background writer; the request never waits on disk
+        self.history_writer.submit(timestamp, entry)
     def get_related_symptoms(self):
         try:
-            if self.symptom not in self.x.columns:
+            if self.symptom not in self.cooccurrence.index:
                 print(f"Symptom '{self.symptom}' not found in the dataset.")
                 return []
-            
-            symptom_rows = self.x[self.x[self.symptom] == 1]
-            
-            if symptom_rows.empty:
+
+            related_symptoms = self.cooccurrence.related(self.symptom)
+            if not related_symptoms:
                 print(f"No data found for symptom '{self.symptom}'.")
-                return []
-            
-            related_symptoms = symptom_rows.sum().sort_values(ascending=False)
-            related_symptoms = related_symptoms[related_symptoms.index != self.symptom]
-            top_5_related = related_symptoms.nlargest(10).index.tolist()
-            
-            return top_5_related
+            return related_symptoms
         except Exception as e:
             print(f"Error in get_related_symptoms: {e}")
             return []
 
+    def encode_symptoms(self, symptom_lists):
+        rows, cols = [], []
+        for row, symptoms in enumerate(symptom_lists):
+            for sym in symptoms:
+                col = self.symptom_index.get(sym)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+        matrix = np.zeros((len(symptom_lists), len(self.symptom_index)), dtype=np.uint8)
+        matrix[rows, cols] = 1
+        return matrix
+
+    def predict_batch(self, symptom_lists):
+        symptom_lists = [[sym.lower().strip() for sym in symptoms] for symptoms in symptom_lists]
+        if not symptom_lists:
+            return []
+
+        # One vectorized prediction for the whole batch
+        matrix = self.encode_symptoms(symptom_lists)
+        clf = model_store.classifier_for(self.model) if len(matrix) >= SKLEARN_BATCH_ROWS else None
+        predictions = clf.predict(matrix) if clf is not None else self.flat_tree.predict_matrix(matrix)
+
+        results = []
+        for symptoms, prediction in zip(symptom_lists, predictions):
+            known = [sym for sym in symptoms if sym in self.symptom_index]
+            if not known:
+                # Nothing to go on; the tree would still name a disease
+                results.append({
+                    "symptoms": [],
+                    "unknownSymptoms": symptoms,
+                    "prognosis": None,
+                    "severity": None,
+                    "description": None,
+                    "precautions": []
+                })
+                continue
+            prediction = str(prediction)
+            results.append({
+                "symptoms": known,
+                "unknownSymptoms": [sym for sym in symptoms if sym not in self.symptom_index],
+                "prognosis": prediction,
+                "severity": self.calculate_severity(symptoms),
+                "description": self.description_dict.get(prediction, "No description available."),
+                "precautions": self.precaution_dict.get(prediction, ["No specific precautions available."])
+            })
+        return results
+
     def get_conclusion(self):
         try:
-            input_vector = np.zeros(len(self.x.columns))
-            for sym in self.current_symptoms:
-                if sym in self.x.columns:
-                    input_vector[self.x.columns.get_loc(sym)] = 1
-
-            prediction = self.clf.predict([input_vector])[0]
+            prediction = self.flat_tree.predict_indices(
+                {self.symptom_index[sym] for sym in self.current_symptoms if sym in self.symptom_index})
             
             severity = self.calculate_severity()
             description = self.description_dict.get(prediction, "No description available.")
@@ -726,8 +785,10 @@ class ChatBot:
             print(f"Error in get_conclusion: {e}")
             return "I'm sorry, but I couldn't generate a conclusion based on the provided symptoms. Please consult a doctor for proper diagnosis."
 
-    def calculate_severity(self):
-        severity_score = sum(self.severity_dict.get(sym, 0) for sym in self.current_symptoms)
+    def calculate_severity(self, symptoms=None):
+        if symptoms is None:
+            symptoms = self.current_symptoms
+        severity_score = sum(self.severity_dict.get(sym, 0) for sym in symptoms)
         if severity_score <= 3:
             return "mild"
         elif severity_score <= 6:
@@ -735,8 +796,17 @@ class ChatBot:
         else:
             return "severe"
 
-    def get_user_history(self):
-        print("Returning history:", self.conversation_history)  # Debug log
+    def get_user_history(self, patient=None):
+        if patient is not None:
+            # Indexed lookup that only reads this patient's turns
+            self.history_writer.flush()
+            return {patient: [{
+                "symptoms": entry['symptoms'],
+                "diagnosis": entry['diagnosis'],
+                "diagnosis_time": entry['diagnosis_time'],
+                "conversation_time": time
+            } for time, entry in self.history_store.entries_for_patient(patient)]}
+
         formatted_history = {}
         for time, entries in self.conversation_history.items():
             for entry in entries:
@@ -764,16 +834,6 @@ class ChatBot:
         return None
 
     def reset(self):
-        
-        self.symptom = ""
-        self.days = 0
-        self.additional_symptoms = []
-        self.state = "ask_name"
-        self.current_patient = None
-        self.current_symptoms = []
-        self.diagnosis = None
-        self.diagnosis_time = None  # Add this line
-        self.state = "initial"
-        self.primary_choice = None
-        self.conversation_history=[]
-        self.__init__()
\ No newline at end of file
+        # Only per-conversation fields are cleared; the model artifact and the
+        # history store are shared and stay open.
+        self.session.reset()
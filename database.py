@@ -1,15 +1,77 @@
+import json
+import logging
+import os
 import sqlite3
 import threading
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# Written at runtime, so kept apart from the healthcare_chatbot.db in the repo
+HISTORY_DB = 'history.db'
+
+# Columns the current code writes; older databases get them added in place
+CONVERSATION_COLUMNS = [
+    ('user_name', 'TEXT'),
+    ('symptom', 'TEXT'),
+    ('days', 'INTEGER'),
+    ('additional_symptoms', 'TEXT'),
+    ('diagnosis', 'TEXT'),
+    ('timestamp', 'DATETIME'),
+    ('symptoms', 'TEXT'),
+    ('diagnosis_time', 'TEXT'),
+    ('user_input', 'TEXT'),
+    ('response', 'TEXT'),
+]
+
+INSERT_TURN = '''
+INSERT INTO conversations (user_name, symptoms, diagnosis, diagnosis_time, user_input, response, timestamp)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+SELECT_TURNS = '''
+SELECT timestamp, user_name, symptoms, diagnosis, diagnosis_time, user_input, response
+FROM conversations WHERE response IS NOT NULL ORDER BY id
+'''
+SELECT_PATIENT_TURNS = '''
+SELECT timestamp, user_name, symptoms, diagnosis, diagnosis_time, user_input, response
+FROM conversations WHERE user_name IS ? AND response IS NOT NULL ORDER BY timestamp, id
+'''
+SELECT_TIMESTAMP_TURNS = '''
+SELECT timestamp, user_name, symptoms, diagnosis, diagnosis_time, user_input, response
+FROM conversations WHERE timestamp = ? AND response IS NOT NULL ORDER BY id
+'''
+SELECT_TIMESTAMPS = '''
+SELECT timestamp FROM conversations WHERE response IS NOT NULL GROUP BY timestamp ORDER BY MIN(id)
+'''
+
+class _Connection(sqlite3.Connection):
+    # sqlite3.Connection itself cannot be weakly referenced
+    pass
+
 
 class Database:
     def __init__(self, db_name='healthcare_chatbot.db'):
         self.db_name = db_name
         self.thread_local = threading.local()
+        # Every thread's open connection, so close() can reach them all. A
+        # thread that exits drops its connection, which then closes itself.
+        self._connections = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
 
     def get_connection(self):
-        if not hasattr(self.thread_local, "connection"):
-            self.thread_local.connection = sqlite3.connect(self.db_name)
-        return self.thread_local.connection
+        connection = getattr(self.thread_local, "connection", None)
+        if connection is None or connection not in self._connections:
+            # sqlite3 keeps compiled statements per connection, so the fixed
+            # SQL strings above are prepared once and reused. close() may run
+            # on another thread, hence check_same_thread=False.
+            connection = sqlite3.connect(self.db_name, cached_statements=128, check_same_thread=False,
+                                         factory=_Connection)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with self._connections_lock:
+                self._connections.add(connection)
+            self.thread_local.connection = connection
+        return connection
 
     def get_cursor(self):
         return self.get_connection().cursor()
@@ -27,8 +89,71 @@ class Database:
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
         )
         ''')
+        existing = {row[1] for row in cursor.execute('PRAGMA table_info(conversations)')}
+        for column, column_type in CONVERSATION_COLUMNS:
+            if column not in existing:
+                cursor.execute(f'ALTER TABLE conversations ADD COLUMN {column} {column_type}')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversations_patient ON conversations (user_name, timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations (timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversations_diagnosis ON conversations (diagnosis)')
+        cursor.execute('CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY, applied_at DATETIME DEFAULT CURRENT_TIMESTAMP)')
         self.get_connection().commit()
 
+    def _turn_params(self, timestamp, entry):
+        user_input, response = entry['conversation']
+        return (entry['patient'], json.dumps(entry['symptoms']), entry['diagnosis'], entry['diagnosis_time'],
+                user_input, json.dumps(response), timestamp)
+
+    def _row_to_turn(self, row):
+        timestamp, user_name, symptoms, diagnosis, diagnosis_time, user_input, response = row
+        return timestamp, {
+            "patient": user_name,
+            "symptoms": json.loads(symptoms) if symptoms else [],
+            "diagnosis": diagnosis,
+            "diagnosis_time": diagnosis_time,
+            "conversation": [user_input, json.loads(response)]
+        }
+
+    def save_turn(self, timestamp, entry):
+        connection = self.get_connection()
+        connection.execute(INSERT_TURN, self._turn_params(timestamp, entry))
+        connection.commit()
+
+    def save_turns(self, turns):
+        connection = self.get_connection()
+        with connection:
+            connection.executemany(INSERT_TURN, [self._turn_params(timestamp, entry) for timestamp, entry in turns])
+
+    def get_turns(self):
+        return [self._row_to_turn(row) for row in self.get_cursor().execute(SELECT_TURNS)]
+
+    def get_patient_turns(self, user_name):
+        return [self._row_to_turn(row) for row in self.get_cursor().execute(SELECT_PATIENT_TURNS, (user_name,))]
+
+    def get_timestamp_turns(self, timestamp):
+        return [self._row_to_turn(row) for row in self.get_cursor().execute(SELECT_TIMESTAMP_TURNS, (timestamp,))]
+
+    def get_timestamps(self):
+        return [row[0] for row in self.get_cursor().execute(SELECT_TIMESTAMPS)]
+
+    def import_history_json(self, path):
+        name = f"import:{os.path.abspath(path)}"
+        connection = self.get_connection()
+        if connection.execute('SELECT 1 FROM migrations WHERE name = ?', (name,)).fetchone():
+            return 0
+        try:
+            with open(path, 'r') as f:
+                history = json.load(f)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Not importing corrupt history file {path}: {e}")
+            return 0
+        turns = [(timestamp, entry) for timestamp, entries in history.items() for entry in entries]
+        with connection:
+            connection.executemany(INSERT_TURN, [self._turn_params(timestamp, entry) for timestamp, entry in turns])
+            connection.execute('INSERT INTO migrations (name) VALUES (?)', (name,))
+        logger.info(f"Imported {len(turns)} conversation turns from {path}")
+        return len(turns)
+
     def save_conversation(self, user_name, symptom, days, additional_symptoms, diagnosis):
         cursor = self.get_cursor()
         cursor.execute('''
@@ -43,6 +168,54 @@ class Database:
         return cursor.fetchall()
 
     def close(self):
-        if hasattr(self.thread_local, "connection"):
-            self.thread_local.connection.close()
-            del self.thread_local.connection
\ No newline at end of file
+        # Closes the connections of all threads; a thread that uses the
+        # database again afterwards opens a new one
+        with self._connections_lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        for connection in connections:
+            connection.close()
+        self.thread_local.connection = None
+
+
+class SQLiteHistory:
+    # Conversation history store for ChatBot backed by the conversations table
+    def __init__(self, db_name=HISTORY_DB, legacy_file=None):
+        self.db = Database(db_name)
+        self.legacy_file = legacy_file
+
+    def load(self):
+        self.db.create_tables()
+        if self.legacy_file and os.path.exists(self.legacy_file):
+            self.db.import_history_json(self.legacy_file)
+
+    def timestamps(self):
+        return self.db.get_timestamps()
+
+    def has(self, timestamp):
+        return bool(self.read(timestamp))
+
+    def read(self, timestamp):
+        return [entry for _, entry in self.db.get_timestamp_turns(timestamp)]
+
+    def items(self):
+        # One ordered query; timestamps come in the order timestamps() gives
+        entries = {}
+        for timestamp, entry in self.db.get_turns():
+            entries.setdefault(timestamp, []).append(entry)
+        return iter(entries.items())
+
+    def append(self, timestamp, entry):
+        self.db.save_turn(timestamp, entry)
+
+    def append_many(self, turns):
+        self.db.save_turns(turns)
+
+    def entries_for_patient(self, patient):
+        return self.db.get_patient_turns(patient)
+
+    def start(self):
+        pass
+
+    def close(self):
+        self.db.close()
@@ -1,5 +1,5 @@
-import aiohttp
 import os
+from http_client import http_client
 from dotenv import load_dotenv
 import logging
 
@@ -18,23 +18,22 @@ class DietPlanAPI:
         if not condition:
             return "No condition provided for diet plan."
 
-        async with aiohttp.ClientSession() as session:
-            params = {
-                "apiKey": self.api_key,
-                "timeFrame": "day",
-                "targetCalories": 2000,
-                "diet": condition
-            }
-            logger.debug(f"API request params: {params}")
-            async with session.get(self.base_url, params=params) as response:
-                logger.debug(f"API response status: {response.status}")
-                if response.status == 200:
-                    data = await response.json()
-                    logger.debug(f"API response data: {data}")
-                    return self.format_diet_plan(data, condition)
-                else:
-                    logger.error(f"API request failed with status {response.status}")
-                    return f"Failed to fetch diet plan for {condition}. Please try again later."
+        params = {
+            "apiKey": self.api_key,
+            "timeFrame": "day",
+            "targetCalories": 2000,
+            "diet": condition
+        }
+        logger.debug(f"API request params: {params}")
+        async with http_client.get(self.base_url, params=params) as response:
+            logger.debug(f"API response status: {response.status}")
+            if response.status == 200:
+                data = await response.json()
+                logger.debug(f"API response data: {data}")
+                return self.format_diet_plan(data, condition)
+            else:
+                logger.error(f"API request failed with status {response.status}")
+                return f"Failed to fetch diet plan for {condition}. Please try again later."
 
     def format_diet_plan(self, data, condition):
         diet_plan = f"Diet Plan for {condition}:\n\n"
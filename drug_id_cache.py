@@ -0,0 +1,124 @@
+import json
+import logging
+import sys
+import time
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+DRUG_ID_DB = 'drug_ids.db'
+# RxNorm identifiers and SPL product names are effectively static
+DRUG_ID_TTL = 180 * 86400
+
+TABLES = {
+    'rxnorm_names': ('name', ['rxcui', 'concept_name', 'synonym']),
+    'rxnorm_concepts': ('rxcui', ['generic_name', 'definition']),
+    'dailymed_spls': ('set_id', ['name', 'generic_name']),
+}
+
+
+class DrugIdCache:
+    # Persistent name -> rxcui -> (generic name, definition) and
+    # set_id -> product names mappings, consulted before RxNav and DailyMed.
+    # A stored row with an empty rxcui records that RxNorm had no match.
+    def __init__(self, db_name=DRUG_ID_DB, ttl=DRUG_ID_TTL):
+        self.db = Database(db_name)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        connection = self.db.get_connection()
+        with connection:
+            for table, (key, columns) in TABLES.items():
+                column_sql = ''.join(f', {column} TEXT' for column in columns)
+                connection.execute(f'CREATE TABLE IF NOT EXISTS {table} ({key} TEXT PRIMARY KEY{column_sql}, stored_at REAL NOT NULL)')
+
+    def _get(self, table, key):
+        key_column, columns = TABLES[table]
+        row = self.db.get_connection().execute(
+            f'SELECT {", ".join(columns)} FROM {table} WHERE {key_column} = ? AND stored_at >= ?',
+            (key, time.time() - self.ttl)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(zip(columns, row))
+
+    def _upsert(self, connection, table, key, values):
+        key_column, columns = TABLES[table]
+        # Only the given columns are written, so partial rows fill in over time
+        given = [column for column in columns if column in values]
+        updates = ''.join(f', {column} = excluded.{column}' for column in given)
+        connection.execute(
+            f'INSERT INTO {table} ({key_column}, {"".join(column + ", " for column in given)}stored_at) '
+            f'VALUES ({"?, " * (len(given) + 1)}?) '
+            f'ON CONFLICT({key_column}) DO UPDATE SET stored_at = excluded.stored_at{updates}',
+            [key] + [values[column] for column in given] + [time.time()])
+
+    def _put(self, table, key, values):
+        connection = self.db.get_connection()
+        with connection:
+            self._upsert(connection, table, key, values)
+
+    def get_name(self, drug_name):
+        return self._get('rxnorm_names', drug_name.strip().lower())
+
+    def put_name(self, drug_name, rxcui, concept_name=None, synonym=None):
+        self._put('rxnorm_names', drug_name.strip().lower(), {'rxcui': rxcui, 'concept_name': concept_name, 'synonym': synonym})
+
+    def get_concept(self, rxcui):
+        return self._get('rxnorm_concepts', rxcui)
+
+    def put_concept(self, rxcui, **values):
+        self._put('rxnorm_concepts', rxcui, values)
+
+    def get_spl(self, set_id):
+        return self._get('dailymed_spls', set_id)
+
+    def put_spl(self, set_id, name, generic_name):
+        self._put('dailymed_spls', set_id, {'name': name, 'generic_name': generic_name})
+
+    def export(self, path):
+        connection = self.db.get_connection()
+        data = {}
+        for table, (key, columns) in TABLES.items():
+            rows = connection.execute(f'SELECT {key}, {", ".join(columns)}, stored_at FROM {table}')
+            data[table] = [dict(zip([key] + columns + ['stored_at'], row)) for row in rows]
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        return {table: len(rows) for table, rows in data.items()}
+
+    def load(self, path):
+        with open(path) as f:
+            data = json.load(f)
+        counts = {}
+        connection = self.db.get_connection()
+        # One transaction for the whole file; loaded rows count as fresh
+        with connection:
+            for table, (key, columns) in TABLES.items():
+                rows = data.get(table, [])
+                for row in rows:
+                    self._upsert(connection, table, row[key], {column: row[column] for column in columns if column in row})
+                counts[table] = len(rows)
+        logger.info(f"Loaded drug identifiers from {path}: {counts}")
+        return counts
+
+    def stats(self):
+        connection = self.db.get_connection()
+        stats = {table: connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in TABLES}
+        stats.update({"hits": self.hits, "misses": self.misses})
+        return stats
+
+
+drug_ids = DrugIdCache()
+
+
+if __name__ == "__main__":
+    # python drug_id_cache.py export drug_ids.json | load drug_ids.json
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 3 or sys.argv[1] not in ('export', 'load'):
+        print("Usage: python drug_id_cache.py export|load <file.json>")
+        sys.exit(1)
+    command, path = sys.argv[1:]
+    counts = drug_ids.export(path) if command == 'export' else drug_ids.load(path)
+    print(f"{command}: {counts}")
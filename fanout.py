@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Shared budget for every source of one "tell me about" lookup
+INFO_DEADLINE = float(os.getenv("INFO_LOOKUP_TIMEOUT", 8))
+
+
+def _outcome(name, task):
+    if task.cancelled():
+        return None
+    if task.exception() is not None:
+        logger.warning(f"{name} lookup failed: {task.exception()}")
+        return None
+    return task.result()
+
+
+async def first_preferred(lookups, timeout=INFO_DEADLINE):
+    # `lookups` is a list of (name, coroutine, accept) in order of preference.
+    # All of them start at once; the most preferred accepted result is
+    # returned as soon as nothing ahead of it is still running, and the
+    # remaining lookups are cancelled. At the deadline the best accepted
+    # result so far wins. Returns (name, result) or (None, None).
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    tasks = [asyncio.ensure_future(coro) for _, coro, _ in lookups]
+    outcomes = {}
+
+    def best(stop_at_pending):
+        for (name, _, accept), task in zip(lookups, tasks):
+            if not task.done():
+                if stop_at_pending:
+                    # A more preferred source may still answer
+                    return False, None
+                continue
+            if name not in outcomes:
+                outcomes[name] = _outcome(name, task)
+            if accept(outcomes[name]):
+                return True, (name, outcomes[name])
+        return True, (None, None)
+
+    try:
+        while True:
+            decided, winner = best(stop_at_pending=True)
+            if decided:
+                return winner
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            pending = [task for task in tasks if not task.done()]
+            await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+
+        logger.warning(f"Lookup deadline of {timeout}s reached; using the sources that answered")
+        return best(stop_at_pending=False)[1]
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
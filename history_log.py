@@ -0,0 +1,382 @@
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections.abc import Mapping
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DIR = 'history'
+
+# Records are written by json.dumps with a fixed key order, so the timestamp
+# can be read from the start of a line without decoding the entries
+SNAPSHOT_PREFIX = re.compile(rb'^\{"time": "([^"]*)"')
+LOG_PREFIX = re.compile(rb'^\{"seq": (\d+), "time": "([^"]*)"(?:, "entry": \{"patient": (null|"(?:[^"\\]|\\.)*"))?')
+
+
+class HistoryView(Mapping):
+    # Read-only {timestamp: [entries]} view over a history store; entries are
+    # only read from the store when they are asked for.
+    def __init__(self, store, before_read=None):
+        self.store = store
+        self.before_read = before_read
+
+    def _sync(self):
+        if self.before_read:
+            self.before_read()
+
+    def __getitem__(self, timestamp):
+        self._sync()
+        entries = self.store.read(timestamp)
+        if not entries:
+            raise KeyError(timestamp)
+        return entries
+
+    def __iter__(self):
+        self._sync()
+        return iter(self.store.timestamps())
+
+    def __len__(self):
+        self._sync()
+        return len(self.store.timestamps())
+
+    def __contains__(self, timestamp):
+        self._sync()
+        return self.store.has(timestamp)
+
+    def items(self):
+        self._sync()
+        return self.store.items()
+
+
+class HistoryLog:
+    # Conversation history as an append-only JSONL event log (one record per
+    # turn) plus periodic snapshot segments. Only timestamp and patient ->
+    # (file, offset) indexes are held in memory; entries are read on demand.
+    def __init__(self, directory=HISTORY_DIR, legacy_file=None, fsync_every=16, fsync_interval=1.0,
+                 compact_threshold=1000, compact_interval=60):
+        self.directory = directory
+        self.legacy_file = legacy_file
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_threshold = compact_threshold
+        self.compact_interval = compact_interval
+
+        self._lock = threading.RLock()
+        self._file = None
+        self._seq = 0
+        self._snapshot_seq = 0
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._index = {}
+        self._patients = {}
+        self._stop = threading.Event()
+        self._compactor = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _snapshot_path(self, seq):
+        return os.path.join(self.directory, f"snapshot-{seq:012d}.jsonl")
+
+    def _segment_path(self, seq):
+        return os.path.join(self.directory, f"log-{seq:012d}.jsonl")
+
+    def _index_path(self, snapshot_path):
+        return f"{snapshot_path[:-len('.jsonl')]}.idx.json"
+
+    def _files(self, prefix):
+        files = []
+        for path in glob.glob(os.path.join(self.directory, f"{prefix}-*.jsonl")):
+            files.append((int(os.path.basename(path)[len(prefix) + 1:-6]), path))
+        return sorted(files)
+
+    def _scan(self, path, pattern):
+        offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                match = pattern.match(line)
+                # A torn final line from a crash mid-write has no newline
+                if match and line.endswith(b'\n'):
+                    yield match, offset
+                elif line.strip():
+                    logger.warning(f"Skipping unreadable record in {path} at offset {offset}")
+                offset += len(line)
+
+    def _add(self, index, key, location):
+        locations = index.setdefault(key, [])
+        # A snapshot line holding several of a patient's turns is listed once
+        if not locations or locations[-1] != location:
+            locations.append(location)
+
+    def _read_record(self, path, offset):
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def _write_snapshot(self, seq, lines):
+        path = self._snapshot_path(seq)
+        index_path = self._index_path(path)
+        index = {}
+        patients = {}
+        with open(f"{path}.tmp", 'wb') as f:
+            for timestamp, line_patients, line in lines:
+                offset = f.tell()
+                index.setdefault(timestamp, []).append(offset)
+                for patient in line_patients:
+                    self._add(patients, patient, offset)
+                f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        index = {"timestamps": index, "patients": list(patients.items())}
+        with open(f"{index_path}.tmp", 'w') as f:
+            # Patients are stored as pairs since a None patient is not a JSON key
+            json.dump(index, f)
+        os.replace(f"{index_path}.tmp", index_path)
+        os.replace(f"{path}.tmp", path)
+        return path, index
+
+    def _snapshot_index(self, path):
+        try:
+            with open(self._index_path(path)) as f:
+                index = json.load(f)
+            if 'patients' in index:
+                return index
+        except (OSError, json.JSONDecodeError):
+            pass
+        logger.warning(f"Rebuilding missing or outdated index for {path}")
+        timestamps = {}
+        patients = {}
+        for match, offset in self._scan(path, SNAPSHOT_PREFIX):
+            timestamps.setdefault(match.group(1).decode('utf-8'), []).append(offset)
+            for entry in self._read_record(path, offset)['entries']:
+                self._add(patients, entry.get('patient'), offset)
+        return {"timestamps": timestamps, "patients": list(patients.items())}
+
+    def _line_patients(self, entries):
+        return list(dict.fromkeys(entry.get('patient') for entry in entries))
+
+    def _import_legacy(self):
+        try:
+            with open(self.legacy_file, 'r') as f:
+                history = json.load(f)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Not importing corrupt history file {self.legacy_file}: {e}")
+            return
+        seq = sum(len(entries) for entries in history.values())
+        self._write_snapshot(seq, ((timestamp, self._line_patients(entries),
+                                    (json.dumps({"time": timestamp, "entries": entries}) + "\n").encode('utf-8'))
+                                   for timestamp, entries in history.items()))
+        logger.info(f"Imported {seq} entries from {self.legacy_file}")
+
+    def _torn_tail(self, path):
+        # Offset just past the last complete line, or None if nothing is torn
+        with open(path, 'rb') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                size = min(65536, position)
+                position -= size
+                f.seek(position)
+                chunk = f.read(size)
+                if position + size == end and chunk.endswith(b'\n'):
+                    return None
+                newline = chunk.rfind(b'\n')
+                if newline >= 0:
+                    return position + newline + 1
+        return 0 if end else None
+
+    def _open_segment(self):
+        if self._file:
+            self._sync()
+            self._file.close()
+        path = self._segment_path(self._seq + 1)
+        # The segment can already exist when a crash tore its first record,
+        # since that record's seq was never counted. Cut the torn bytes off
+        # so new records start on a line boundary.
+        if os.path.exists(path):
+            torn = self._torn_tail(path)
+            if torn is not None:
+                logger.warning(f"Truncating torn record in {path} at offset {torn}")
+                with open(path, 'r+b') as f:
+                    f.truncate(torn)
+        self._file = open(path, 'ab')
+
+    def _sync(self):
+        if self._file and self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def load(self):
+        with self._lock:
+            start_time = time.time()
+            self._index = {}
+            self._patients = {}
+            if not self._files('snapshot') and not self._files('log') and self.legacy_file and os.path.exists(self.legacy_file):
+                self._import_legacy()
+
+            snapshots = self._files('snapshot')
+            if snapshots:
+                self._snapshot_seq, path = snapshots[-1]
+                self._index, self._patients = self._locations(path, self._snapshot_index(path))
+
+            # Only the log tail written since the last snapshot is scanned
+            self._seq = self._snapshot_seq
+            for start, path in self._files('log'):
+                for match, offset in self._scan(path, LOG_PREFIX):
+                    seq = int(match.group(1))
+                    if seq > self._snapshot_seq:
+                        if match.group(3) is not None:
+                            patient = json.loads(match.group(3))
+                        else:
+                            patient = self._read_record(path, offset)['entry'].get('patient')
+                        self._index.setdefault(match.group(2).decode('utf-8'), []).append((path, offset))
+                        self._add(self._patients, patient, (path, offset))
+                        self._seq = max(self._seq, seq)
+
+            self._open_segment()
+            logger.info(f"Indexed {len(self._index)} history timestamps in {time.time() - start_time:.3f} seconds")
+
+    def append(self, timestamp, entry):
+        self.append_many([(timestamp, entry)])
+
+    def append_many(self, turns):
+        with self._lock:
+            for timestamp, entry in turns:
+                self._seq += 1
+                offset = self._file.tell()
+                self._file.write((json.dumps({"seq": self._seq, "time": timestamp, "entry": entry}) + "\n").encode('utf-8'))
+                self._index.setdefault(timestamp, []).append((self._file.name, offset))
+                self._add(self._patients, entry.get('patient'), (self._file.name, offset))
+            self._file.flush()
+            self._pending += len(turns)
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def timestamps(self):
+        with self._lock:
+            return list(self._index)
+
+    def has(self, timestamp):
+        with self._lock:
+            return timestamp in self._index
+
+    def read(self, timestamp):
+        with self._lock:
+            entries = []
+            for path, offset in self._index.get(timestamp, ()):
+                record = self._read_record(path, offset)
+                if 'entries' in record:
+                    entries.extend(record['entries'])
+                else:
+                    entries.append(record['entry'])
+            return entries
+
+    def items(self):
+        for timestamp in self.timestamps():
+            yield timestamp, self.read(timestamp)
+
+    def entries_for_patient(self, patient):
+        with self._lock:
+            turns = []
+            for path, offset in self._patients.get(patient, ()):
+                record = self._read_record(path, offset)
+                for entry in record.get('entries', [record.get('entry')]):
+                    if entry.get('patient') == patient:
+                        turns.append((record['time'], entry))
+            return turns
+
+    def _locations(self, path, snapshot_index):
+        index = {timestamp: [(path, offset) for offset in offsets]
+                 for timestamp, offsets in snapshot_index['timestamps'].items()}
+        patients = {patient: [(path, offset) for offset in offsets]
+                    for patient, offsets in snapshot_index['patients']}
+        return index, patients
+
+    def compact(self):
+        with self._lock:
+            if self._seq == self._snapshot_seq:
+                return
+            snapshot_seq = self._snapshot_seq
+            upto = self._seq
+            # An empty active segment already starts after `upto`; keep it
+            frozen = [(start, path) for start, path in self._files('log') if start <= upto]
+            self._open_segment()
+
+        old_snapshot = self._snapshot_path(snapshot_seq)
+
+        def lines():
+            # Streamed outside the lock: old snapshot lines are copied as-is
+            # and each frozen log record becomes one snapshot line
+            if os.path.exists(old_snapshot):
+                line_patients = {}
+                for patient, offsets in self._snapshot_index(old_snapshot)['patients']:
+                    for offset in offsets:
+                        line_patients.setdefault(offset, []).append(patient)
+                offset = 0
+                with open(old_snapshot, 'rb') as f:
+                    for line in f:
+                        match = SNAPSHOT_PREFIX.match(line)
+                        if match and line.endswith(b'\n'):
+                            yield match.group(1).decode('utf-8'), line_patients.get(offset, []), line
+                        offset += len(line)
+            for start, path in frozen:
+                for match, offset in self._scan(path, LOG_PREFIX):
+                    if snapshot_seq < int(match.group(1)) <= upto:
+                        record = self._read_record(path, offset)
+                        line = json.dumps({"time": record['time'], "entries": [record['entry']]}) + "\n"
+                        yield record['time'], [record['entry'].get('patient')], line.encode('utf-8')
+
+        path, snapshot_index = self._write_snapshot(upto, lines())
+
+        with self._lock:
+            # Point the index at the new snapshot, keeping the active segments
+            retired = {old_snapshot} | {frozen_path for start, frozen_path in frozen}
+            index, patients = self._locations(path, snapshot_index)
+            for timestamp, locations in self._index.items():
+                for location in locations:
+                    if location[0] not in retired:
+                        index.setdefault(timestamp, []).append(location)
+            for patient, locations in self._patients.items():
+                for location in locations:
+                    if location[0] not in retired:
+                        self._add(patients, patient, location)
+            self._index = index
+            self._patients = patients
+            self._snapshot_seq = upto
+            for seq, snapshot_path in self._files('snapshot'):
+                if seq < upto:
+                    os.remove(snapshot_path)
+                    if os.path.exists(self._index_path(snapshot_path)):
+                        os.remove(self._index_path(snapshot_path))
+            for start, frozen_path in frozen:
+                os.remove(frozen_path)
+        logger.info(f"Compacted history log into {path}")
+
+    def _run(self):
+        while not self._stop.wait(min(self.fsync_interval, self.compact_interval)):
+            with self._lock:
+                if time.monotonic() - self._last_sync >= self.fsync_interval:
+                    self._sync()
+                due = self._seq - self._snapshot_seq >= self.compact_threshold
+            if due:
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.error(f"History compaction failed: {e}")
+
+    def start(self):
+        if self._compactor is None:
+            self._compactor = threading.Thread(target=self._run, name="history-compactor", daemon=True)
+            self._compactor.start()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._file:
+                self._sync()
+                self._file.close()
+                self._file = None
@@ -0,0 +1,125 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+# Longest a read waits for queued turns before going ahead without them
+FLUSH_TIMEOUT = float(os.getenv("HISTORY_FLUSH_TIMEOUT", 2))
+
+
+class HistoryWriter:
+    # Takes turn events off the request path and writes them to the history
+    # store from one background thread, one batch per burst.
+    def __init__(self, store, max_queue=10000, max_batch=500):
+        self.store = store
+        self.max_batch = max_batch
+        self.queue = queue.Queue(maxsize=max_queue)
+
+        self.flushes = 0
+        self.turns_written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.flush_timeouts = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, timestamp, entry):
+        with self._close_lock:
+            if self._closed:
+                # The thread is gone; nothing would take the turn off the queue
+                self.dropped += 1
+                logger.error(f"History writer closed, dropped turn at {timestamp}")
+                return
+            try:
+                self.queue.put_nowait((timestamp, entry))
+            except queue.Full:
+                # Never block a request on disk; the drop is visible in stats()
+                self.dropped += 1
+                logger.error(f"History writer queue full, dropped turn at {timestamp}")
+
+    def _run(self):
+        stopping = False
+        try:
+            while not stopping:
+                item = self.queue.get()
+                batch = []
+                # Coalesce everything already queued into one flush
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                    else:
+                        batch.append(item)
+                    if stopping or len(batch) >= self.max_batch:
+                        break
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    self._flush(batch)
+                for _ in range(len(batch) + (1 if stopping else 0)):
+                    self.queue.task_done()
+        finally:
+            self.store.close()
+
+    def _flush(self, batch):
+        start_time = time.perf_counter()
+        try:
+            self.store.append_many(batch)
+            self.turns_written += len(batch)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Failed to write {len(batch)} history turns: {e}")
+        elapsed = (time.perf_counter() - start_time) * 1000
+        self.flushes += 1
+        self.last_flush_ms = elapsed
+        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+        self.total_flush_ms += elapsed
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        # Waits until the queued turns are written, or `timeout` seconds pass.
+        # Returns False on timeout; the caller then reads without them.
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.flush_timeouts += 1
+                    logger.warning(f"History writer flush timed out after {timeout}s")
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self):
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            "queueDepth": self.queue.qsize(),
+            "queueCapacity": self.queue.maxsize,
+            "flushes": self.flushes,
+            "turnsWritten": self.turns_written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "flushTimeouts": self.flush_timeouts,
+            "lastFlushMs": round(self.last_flush_ms, 3),
+            "maxFlushMs": round(self.max_flush_ms, 3),
+            "avgFlushMs": round(self.total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+        }
@@ -0,0 +1,404 @@
+import asyncio
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import ssl
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from cache import BackgroundLoop, FetchAbandoned
+
+logger = logging.getLogger(__name__)
+
+POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", 100))
+POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", 20))
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 10))
+# End-to-end budget for all upstream calls made by one chat turn
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", 20))
+
+
+class HostPolicy:
+    __slots__ = ('connect_timeout', 'read_timeout', 'hedge_after', 'failure_threshold', 'reset_timeout')
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, hedge_after=None,
+                 failure_threshold=5, reset_timeout=30):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # Seconds before a second copy of a GET is sent; None disables hedging
+        self.hedge_after = hedge_after
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+
+HOST_POLICIES = {
+    # Free NLM and FDA services: a duplicate of a stuck GET is cheap
+    "wsearch.nlm.nih.gov": HostPolicy(read_timeout=8, hedge_after=1.5),
+    "rxnav.nlm.nih.gov": HostPolicy(read_timeout=5, hedge_after=1.0),
+    "dailymed.nlm.nih.gov": HostPolicy(read_timeout=8, hedge_after=2.0),
+    "api.fda.gov": HostPolicy(read_timeout=8, hedge_after=2.0),
+    # Metered APIs are never hedged
+    "trackapi.nutritionix.com": HostPolicy(read_timeout=8),
+    "api.spoonacular.com": HostPolicy(read_timeout=10),
+    "exercisedb.p.rapidapi.com": HostPolicy(read_timeout=8),
+    "wger.de": HostPolicy(read_timeout=8),
+}
+
+
+def load_host_policies(policies=HOST_POLICIES):
+    # HTTP_HOST_POLICIES='{"api.fda.gov": {"read_timeout": 4, "hedge_after": null}}'
+    overrides = json.loads(os.getenv("HTTP_HOST_POLICIES") or '{}')
+    for host, settings in overrides.items():
+        policy = policies.setdefault(host, HostPolicy())
+        for name, value in settings.items():
+            setattr(policy, name, value)
+    return policies
+
+
+_deadline = contextvars.ContextVar('http_deadline', default=None)
+
+
+@contextlib.contextmanager
+def request_deadline(seconds=REQUEST_DEADLINE):
+    # Every upstream call made inside, including from child tasks, shares
+    # one budget; a nested deadline can only shorten it
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class HttpError(Exception):
+    def __init__(self, status, reason, url):
+        super().__init__(f"{status} {reason} for {url}")
+        self.status = status
+        self.reason = reason
+        self.url = url
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, host, retry_in):
+        super().__init__(f"{host} is unavailable; retrying in {retry_in:.1f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class DeadlineExceeded(asyncio.TimeoutError, FetchAbandoned):
+    # Raised when the caller's budget runs out; other callers sharing the
+    # same cache fetch retry with their own budget
+    pass
+
+
+class CircuitBreaker:
+    # Opens after `failure_threshold` consecutive failures and fails fast for
+    # `reset_timeout` seconds; then a single probe request decides whether
+    # it closes again. Only touched from the client loop.
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.opens = 0
+        self.rejected = 0
+
+    def retry_in(self):
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        if self.state == 'open' and not self.retry_in():
+            self.state = 'half_open'
+        if self.state == 'closed' or (self.state == 'half_open' and not self.probing):
+            self.probing = self.state == 'half_open'
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            if self.state != 'open':
+                self.opens += 1
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        # The request was abandoned by its caller; it says nothing about the host
+        self.probing = False
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opens": self.opens,
+            "rejected": self.rejected,
+            "retryIn": round(self.retry_in(), 1) if self.state == 'open' else 0.0,
+        }
+
+
+class BufferedResponse:
+    # The body is read on the client loop, so callers on any loop get the
+    # same status/headers/json()/text() they used from aiohttp
+    def __init__(self, status, reason, headers, body, url):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.url = url
+
+    async def read(self):
+        return self.body
+
+    async def text(self, encoding=None):
+        return self.body.decode(encoding or self.charset, errors='replace')
+
+    async def json(self, **kwargs):
+        return json.loads(self.body.decode(self.charset))
+
+    @property
+    def charset(self):
+        content_type = self.headers.get('Content-Type', '')
+        for part in content_type.split(';')[1:]:
+            name, _, value = part.strip().partition('=')
+            if name.lower() == 'charset' and value:
+                return value.strip('"')
+        return 'utf-8'
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise HttpError(self.status, self.reason, self.url)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+class _RequestContext:
+    def __init__(self, client, method, url, kwargs):
+        self.client = client
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+
+    async def __aenter__(self):
+        return await self.client.request(self.method, self.url, **self.kwargs)
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+class HttpClient:
+    # One aiohttp ClientSession for the whole process, owned by a background
+    # event loop. Flask gives each async view a short-lived loop of its own;
+    # requests are handed to the client loop so pooled keep-alive
+    # connections, the DNS cache and the TLS context outlive the view.
+    # Each host gets its own timeouts, circuit breaker and optional hedging.
+    def __init__(self, limit=POOL_LIMIT, limit_per_host=POOL_LIMIT_PER_HOST, dns_ttl=300, timeout=30,
+                 policies=None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.timeout = timeout
+        self.policies = load_host_policies() if policies is None else policies
+        self.ssl_context = ssl.create_default_context()
+        self._loop = BackgroundLoop("http-client")
+        self._session = None
+        self._breakers = {}
+
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.hedges = 0
+        self.deadline_exceeded = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.total_ms = 0.0
+        self.hosts = {}
+        atexit.register(self.close)
+
+    def _get_session(self):
+        # Created on the client loop so the session is bound to it
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             ttl_dns_cache=self.dns_ttl, ssl=self.ssl_context,
+                                             keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    def policy(self, host):
+        return self.policies.get(host) or HostPolicy()
+
+    def _breaker(self, host, policy):
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(policy.failure_threshold, policy.reset_timeout)
+        return self._breakers[host]
+
+    def _host_stats(self, host):
+        if host not in self.hosts:
+            self.hosts[host] = {"requests": 0, "errors": 0, "timeouts": 0, "inFlight": 0, "maxInFlight": 0,
+                                "saturated": 0, "hedges": 0, "hedgeWins": 0}
+        return self.hosts[host]
+
+    async def _send(self, method, url, kwargs):
+        host = self._host_stats(urlsplit(url).hostname)
+        if host["inFlight"] >= self.limit_per_host or self.in_flight >= self.limit:
+            # This request will queue for a pooled connection
+            host["saturated"] += 1
+        self.requests += 1
+        host["requests"] += 1
+        self.in_flight += 1
+        host["inFlight"] += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        host["maxInFlight"] = max(host["maxInFlight"], host["inFlight"])
+        start_time = time.perf_counter()
+        try:
+            async with self._get_session().request(method, url, **kwargs) as response:
+                body = await response.read()
+                return BufferedResponse(response.status, response.reason, response.headers.copy(), body, str(response.url))
+        except Exception:
+            self.errors += 1
+            host["errors"] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            host["inFlight"] -= 1
+            self.total_ms += (time.perf_counter() - start_time) * 1000
+
+    async def _hedged(self, method, url, kwargs, policy, host):
+        # Idempotent GETs only: if the first attempt is slow a second one is
+        # sent, the first answer wins and the other attempt is cancelled
+        attempts = [asyncio.ensure_future(self._send(method, url, kwargs))]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=policy.hedge_after)
+            if not done:
+                self.hedges += 1
+                host["hedges"] += 1
+                attempts.append(asyncio.ensure_future(self._send(method, url, kwargs)))
+            pending = set(attempts)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is not attempts[0]:
+                            host["hedgeWins"] += 1
+                        return attempt.result()
+                if not pending:
+                    raise attempt.exception()
+        finally:
+            unfinished = [attempt for attempt in attempts if not attempt.done()]
+            for attempt in unfinished:
+                attempt.cancel()
+            if unfinished:
+                await asyncio.gather(*unfinished, return_exceptions=True)
+
+    async def _call(self, method, url, kwargs, budget, hedge):
+        hostname = urlsplit(url).hostname
+        policy = self.policy(hostname)
+        breaker = self._breaker(hostname, policy)
+        host = self._host_stats(hostname)
+        if not breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError(hostname, breaker.retry_in())
+
+        kwargs.setdefault('timeout', aiohttp.ClientTimeout(total=self.timeout, sock_connect=policy.connect_timeout,
+                                                           sock_read=policy.read_timeout))
+        if method == 'GET' and hedge and policy.hedge_after is not None:
+            attempt = self._hedged(method, url, kwargs, policy, host)
+        else:
+            attempt = self._send(method, url, kwargs)
+        start_time = time.monotonic()
+        try:
+            response = await asyncio.wait_for(attempt, budget)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except asyncio.TimeoutError as e:
+            if budget is not None and time.monotonic() - start_time >= budget:
+                # The caller's budget ran out, which is no fault of the host
+                self.deadline_exceeded += 1
+                breaker.release()
+                raise DeadlineExceeded(f"Request deadline exceeded during {method} {url}") from e
+            self.timeouts += 1
+            host["timeouts"] += 1
+            breaker.record_failure()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        if response.status >= 500 or response.status == 429:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    async def request(self, method, url, hedge=True, **kwargs):
+        budget = None
+        deadline = _deadline.get()
+        if deadline is not None:
+            budget = deadline - time.monotonic()
+            if budget <= 0:
+                self.deadline_exceeded += 1
+                raise DeadlineExceeded(f"Request deadline exceeded before {method} {url}")
+        future = self._loop.submit(self._call(method, url, kwargs, budget, hedge))
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    def get(self, url, **kwargs):
+        return _RequestContext(self, 'GET', url, kwargs)
+
+    def post(self, url, **kwargs):
+        return _RequestContext(self, 'POST', url, kwargs)
+
+    def stats(self):
+        hosts = {}
+        for name, stats in list(self.hosts.items()):
+            hosts[name] = dict(stats)
+            if name in self._breakers:
+                hosts[name]["breaker"] = self._breakers[name].stats()
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "hedges": self.hedges,
+            "deadlineExceeded": self.deadline_exceeded,
+            "inFlight": self.in_flight,
+            "maxInFlight": self.max_in_flight,
+            "limit": self.limit,
+            "limitPerHost": self.limit_per_host,
+            "saturation": round(self.in_flight / self.limit, 3),
+            "avgLatencyMs": round(self.total_ms / self.requests, 3) if self.requests else 0.0,
+            "hosts": hosts,
+        }
+
+    def close(self):
+        if self._session is not None and not self._session.closed:
+            try:
+                self._loop.submit(self._session.close()).result(timeout=5)
+            except Exception as e:
+                logger.warning(f"Error closing HTTP client session: {e}")
+
+
+http_client = HttpClient()
@@ -0,0 +1,101 @@
+import json
+import logging
+import time
+
+from cache import normalize_key
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_DB = 'knowledge.db'
+
+# MedlinePlus summaries, OpenFDA label fields and MedicationAPI results,
+# each keyed by the normalized name they were looked up with
+TABLES = ('disease_topics', 'drug_labels', 'disease_medicines')
+
+
+class KnowledgeSnapshot:
+    # Local copy of upstream answers for the names the bot is asked about
+    # most, written by snapshot_builder and read before any API call
+    def __init__(self, db_name=KNOWLEDGE_DB):
+        self.db = Database(db_name)
+        self.hits = 0
+        self.misses = 0
+        connection = self.db.get_connection()
+        with connection:
+            for table in TABLES:
+                connection.execute(f'CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, name TEXT NOT NULL, '
+                                   f'value TEXT NOT NULL, stored_at REAL NOT NULL) WITHOUT ROWID')
+            connection.execute('CREATE TABLE IF NOT EXISTS snapshot_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    def _get(self, table, name):
+        row = self.db.get_connection().execute(f'SELECT value FROM {table} WHERE key = ?', (normalize_key(name),)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def _put(self, table, name, value):
+        connection = self.db.get_connection()
+        with connection:
+            connection.execute(f'INSERT OR REPLACE INTO {table} (key, name, value, stored_at) VALUES (?, ?, ?, ?)',
+                               (normalize_key(name), name, json.dumps(value), time.time()))
+
+    def get_disease(self, disease_name):
+        return self._get('disease_topics', disease_name)
+
+    def put_disease(self, disease_name, info):
+        self._put('disease_topics', disease_name, info)
+
+    def get_drug(self, drug_name):
+        return self._get('drug_labels', drug_name)
+
+    def put_drug(self, drug_name, label):
+        self._put('drug_labels', drug_name, label)
+
+    def get_medicines(self, disease_name):
+        return self._get('disease_medicines', disease_name)
+
+    def put_medicines(self, disease_name, medicines):
+        self._put('disease_medicines', disease_name, medicines)
+
+    def items(self, table):
+        rows = self.db.get_connection().execute(f'SELECT name, value FROM {table}')
+        return [(name, json.loads(value)) for name, value in rows]
+
+    def get_meta(self, key):
+        row = self.db.get_connection().execute('SELECT value FROM snapshot_meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_meta(self, key, value):
+        connection = self.db.get_connection()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO snapshot_meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    def claim_build(self, interval):
+        # Several workers may run a refresher; only the first to find the
+        # snapshot due starts a build, the others see its claim and skip
+        connection = self.db.get_connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute("SELECT value FROM snapshot_meta WHERE key = 'build_started'").fetchone()
+            if row and time.time() - json.loads(row[0]) < interval:
+                connection.rollback()
+                return False
+            connection.execute("INSERT OR REPLACE INTO snapshot_meta (key, value) VALUES ('build_started', ?)",
+                               (json.dumps(time.time()),))
+            connection.commit()
+            return True
+        except Exception:
+            connection.rollback()
+            raise
+
+    def stats(self):
+        connection = self.db.get_connection()
+        stats = {table: connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in TABLES}
+        stats.update({"hits": self.hits, "misses": self.misses, "lastBuild": self.get_meta('last_build')})
+        return stats
+
+
+knowledge = KnowledgeSnapshot()
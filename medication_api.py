@@ -1,21 +1,36 @@
-import aiohttp
+import asyncio
+import functools
 import urllib.parse
 import xmltodict
 import json
 import logging
+from drug_id_cache import drug_ids
+from knowledge_snapshot import knowledge
+from http_client import http_client
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 class MedicationAPI:
-    def __init__(self, session):
-        self.session = session
+    # Enrichment lookups run concurrently per stage; whatever has not come
+    # back by the stage deadline is dropped and the label data is kept as is
+    max_concurrency = 8
+    stage_timeout = 5.0
+
+    def __init__(self, session=None):
+        self.session = session or http_client
         self.openfda_url = "https://api.fda.gov/drug/label.json"
         self.rxnorm_url = "https://rxnav.nlm.nih.gov/REST"
         self.dailymed_url = "https://dailymed.nlm.nih.gov/dailymed/services/v2"
 
    
     async def get_medicines_for_disease(self, disease_name):
+        medicines = knowledge.get_medicines(disease_name)
+        if medicines is not None:
+            return medicines
+        return await self.fetch_medicines_for_disease(disease_name)
+
+    async def fetch_medicines_for_disease(self, disease_name):
         encoded_disease = urllib.parse.quote(disease_name)
         url = f"{self.openfda_url}?search=indications_and_usage:{encoded_disease}&limit=10"
         
@@ -44,44 +59,80 @@ class MedicationAPI:
                             medicine['generic_name'] = result['openfda'].get('generic_name', ['N/A'])[0]
 
                         logger.debug(f"Initial medicine info: {medicine}")
-
-                        # If name is still N/A, try RxNorm
-                        if medicine['name'] == 'N/A' or medicine['generic_name'] == 'N/A':
-                            rxnorm_info = await self.get_rxnorm_info(medicine['generic_name'] if medicine['generic_name'] != 'N/A' else medicine['name'])
-                            if rxnorm_info:
-                                if medicine['name'] == 'N/A':
-                                    medicine['name'] = rxnorm_info.get('name', 'N/A')
-                                if medicine['generic_name'] == 'N/A':
-                                    medicine['generic_name'] = rxnorm_info.get('generic_name', 'N/A')
-
-                        # If name is still N/A, try DailyMed
-                        if medicine['name'] == 'N/A' or medicine['generic_name'] == 'N/A':
-                            dailymed_info = await self.get_dailymed_info(result['id'])
-                            if dailymed_info:
-                                if medicine['name'] == 'N/A':
-                                    medicine['name'] = dailymed_info.get('name', 'N/A')
-                                if medicine['generic_name'] == 'N/A':
-                                    medicine['generic_name'] = dailymed_info.get('generic_name', 'N/A')
-
-                        # Include the medicine if it has a name, generic name, or description
+                        medicines.append(medicine)
+
+                    # If a name is still N/A, try RxNorm for all such results at once
+                    lookups = {i: functools.partial(self.get_rxnorm_info, m['generic_name'] if m['generic_name'] != 'N/A' else m['name'])
+                               for i, m in enumerate(medicines) if self._needs_names(m)}
+                    for i, rxnorm_info in (await self._run_stage("RxNorm", lookups)).items():
+                        self._fill_names(medicines[i], rxnorm_info)
+
+                    # Then DailyMed for whatever is still missing
+                    lookups = {i: functools.partial(self.get_dailymed_info, data['results'][i]['id'])
+                               for i, m in enumerate(medicines) if self._needs_names(m)}
+                    for i, dailymed_info in (await self._run_stage("DailyMed", lookups)).items():
+                        self._fill_names(medicines[i], dailymed_info)
+
+                    # Include the medicine if it has a name, generic name, or description
+                    complete = []
+                    for medicine in medicines:
                         if medicine['name'] != 'N/A' or medicine['generic_name'] != 'N/A' or medicine['description'] != 'N/A':
                             logger.debug(f"Final medicine info: {medicine}")
-                            medicines.append(medicine)
+                            complete.append(medicine)
                         else:
                             logger.warning(f"Skipping medicine due to lack of information: {medicine}")
-
-                    return medicines
+                    return complete
             else:
                 logger.error(f"OpenFDA API error. Status: {response.status}")
         logger.warning(f"No medicines found for disease: {disease_name}")
         return None
 
-    # ... rest of the methods ...
+    def _needs_names(self, medicine):
+        return medicine['name'] == 'N/A' or medicine['generic_name'] == 'N/A'
+
+    def _fill_names(self, medicine, info):
+        if info:
+            if medicine['name'] == 'N/A':
+                medicine['name'] = info.get('name', 'N/A')
+            if medicine['generic_name'] == 'N/A':
+                medicine['generic_name'] = info.get('generic_name', 'N/A')
+
+    async def _run_stage(self, stage, lookups):
+        # lookups maps a result index to a zero-argument coroutine function
+        if not lookups:
+            return {}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def limited(lookup):
+            async with semaphore:
+                return await lookup()
+
+        tasks = {asyncio.ensure_future(limited(lookup)): i for i, lookup in lookups.items()}
+        done, pending = await asyncio.wait(tasks, timeout=self.stage_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(f"{stage} stage deadline hit, {len(pending)} of {len(tasks)} lookups dropped")
+
+        results = {}
+        for task in done:
+            if task.exception() is not None:
+                logger.warning(f"{stage} lookup failed: {task.exception()}")
+            else:
+                results[tasks[task]] = task.result()
+        return results
 
 
     async def get_rxnorm_info(self, drug_name):
         if drug_name == 'N/A':
             return None
+        cached = drug_ids.get_name(drug_name)
+        if cached is not None:
+            if not cached['rxcui']:
+                return None
+            return await self._rxnorm_concept(cached['rxcui'], cached['concept_name'], cached['synonym'])
+
         encoded_name = urllib.parse.quote(drug_name)
         url = f"{self.rxnorm_url}/drugs?name={encoded_name}"
         
@@ -104,18 +155,31 @@ class MedicationAPI:
                                 prop = props[0]
                             else:
                                 prop = props
-                            return {
-                                'name': prop.get('name', 'N/A'),
-                                'rxcui': prop.get('rxcui', 'N/A'),
-                                'synonym': prop.get('synonym', 'N/A'),
-                                'generic_name': await self.get_generic_name(prop.get('rxcui', 'N/A')),
-                                'definition': await self.get_drug_definition(prop.get('rxcui', 'N/A'))
-                            }
+                            rxcui = prop.get('rxcui', 'N/A')
+                            drug_ids.put_name(drug_name, rxcui, prop.get('name', 'N/A'), prop.get('synonym', 'N/A'))
+                            return await self._rxnorm_concept(rxcui, prop.get('name', 'N/A'), prop.get('synonym', 'N/A'))
+                # Remember that RxNorm has no concept for this name
+                drug_ids.put_name(drug_name, None)
         return None
 
+    async def _rxnorm_concept(self, rxcui, name, synonym):
+        generic_name, definition = await asyncio.gather(
+            self.get_generic_name(rxcui), self.get_drug_definition(rxcui))
+        return {
+            'name': name,
+            'rxcui': rxcui,
+            'synonym': synonym,
+            'generic_name': generic_name,
+            'definition': definition
+        }
+
     async def get_generic_name(self, rxcui):
         if rxcui == 'N/A':
             return 'N/A'
+        cached = drug_ids.get_concept(rxcui)
+        if cached is not None and cached['generic_name'] is not None:
+            return cached['generic_name']
+
         url = f"{self.rxnorm_url}/rxcui/{rxcui}/allrelated"
         
         async with self.session.get(url) as response:
@@ -129,15 +193,23 @@ class MedicationAPI:
                 else:
                     return 'N/A'
 
+                generic_name = 'N/A'
                 if 'allRelatedGroup' in data:
                     for group in data['allRelatedGroup']['conceptGroup']:
                         if group['tty'] == 'IN':  # IN stands for Ingredient (generic)
-                            return group['conceptProperties'][0]['name']
+                            generic_name = group['conceptProperties'][0]['name']
+                            break
+                drug_ids.put_concept(rxcui, generic_name=generic_name)
+                return generic_name
         return 'N/A'
 
     async def get_drug_definition(self, rxcui):
         if rxcui == 'N/A':
             return 'N/A'
+        cached = drug_ids.get_concept(rxcui)
+        if cached is not None and cached['definition'] is not None:
+            return cached['definition']
+
         url = f"{self.rxnorm_url}/rxcui/{rxcui}/definition"
         
         async with self.session.get(url) as response:
@@ -151,15 +223,22 @@ class MedicationAPI:
                 else:
                     return 'N/A'
 
+                definition = 'N/A'
                 if 'definitionGroup' in data and 'definition' in data['definitionGroup']:
                     definitions = data['definitionGroup']['definition']
                     if isinstance(definitions, list):
-                        return definitions[0].get('definition', 'N/A')
+                        definition = definitions[0].get('definition', 'N/A')
                     elif isinstance(definitions, dict):
-                        return definitions.get('definition', 'N/A')
+                        definition = definitions.get('definition', 'N/A')
+                drug_ids.put_concept(rxcui, definition=definition)
+                return definition
         return 'N/A'
 
     async def get_dailymed_info(self, set_id):
+        cached = drug_ids.get_spl(set_id)
+        if cached is not None:
+            return cached
+
         url = f"{self.dailymed_url}/spls/{set_id}.json"
         
         async with self.session.get(url) as response:
@@ -167,8 +246,10 @@ class MedicationAPI:
                 data = await response.json()
                 if 'data' in data and 'spl' in data['data']:
                     spl = data['data']['spl']
-                    return {
+                    info = {
                         'name': spl.get('productNameList', [{}])[0].get('productName', 'N/A'),
                         'generic_name': spl.get('genericMedicineList', [{}])[0].get('genericMedicineName', 'N/A'),
                     }
-        return None
\ No newline at end of file
+                    drug_ids.put_spl(set_id, info['name'], info['generic_name'])
+                    return info
+        return None
@@ -0,0 +1,176 @@
+import csv
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+
+import binary_data
+from symptom_index import SymptomCooccurrence
+from symptom_resolver import SymptomResolver
+from tree_engine import FlatTree
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIR = 'artifacts'
+ARTIFACT_VERSION = 9
+TRAINING_FILE = 'Data/Training.csv'
+SEVERITY_FILE = 'MasterData/symptom_severity.csv'
+DESCRIPTION_FILE = 'MasterData/symptom_description.csv'
+PRECAUTION_FILE = 'MasterData/symptom_precaution.csv'
+SOURCE_FILES = [TRAINING_FILE, SEVERITY_FILE, DESCRIPTION_FILE, PRECAUTION_FILE]
+
+
+class ModelArtifact:
+    def __init__(self, flat_tree, columns, cooccurrence, disease_symptoms, severity_dict, description_dict, precaution_dict):
+        self.flat_tree = flat_tree
+        self.columns = list(columns)
+        self.symptom_index = {symptom: i for i, symptom in enumerate(self.columns)}
+        self.symptom_resolver = SymptomResolver(self.columns)
+        self.cooccurrence = cooccurrence
+        # prognosis -> indices of every symptom seen with it in training
+        self.disease_symptoms = disease_symptoms
+        self.severity_dict = severity_dict
+        self.description_dict = description_dict
+        self.precaution_dict = precaution_dict
+
+
+def load_symptom_data():
+    severity_dict = {}
+    description_dict = {}
+    precaution_dict = {}
+
+    with open(SEVERITY_FILE, encoding='utf-8') as csv_file:
+        csv_reader = csv.reader(csv_file, delimiter=',')
+        for row in csv_reader:
+            if len(row) >= 2:
+                severity_dict[row[0]] = int(row[1])
+
+    with open(DESCRIPTION_FILE, encoding='utf-8') as csv_file:
+        csv_reader = csv.reader(csv_file, delimiter=',')
+        for row in csv_reader:
+            if len(row) >= 2:
+                description_dict[row[0]] = row[1]
+
+    with open(PRECAUTION_FILE, encoding='utf-8') as csv_file:
+        csv_reader = csv.reader(csv_file, delimiter=',')
+        for row in csv_reader:
+            if len(row) >= 5:
+                precaution_dict[row[0]] = [row[1], row[2], row[3], row[4]]
+
+    return severity_dict, description_dict, precaution_dict
+
+
+def build_artifact():
+    # Training-only dependencies; loading a saved artifact never needs sklearn
+    from sklearn.model_selection import train_test_split
+    from sklearn.tree import DecisionTreeClassifier
+
+    training = binary_data.load('training', TRAINING_FILE)
+    x = training.x
+    x_train, x_test, y_train, y_test = train_test_split(x, training.codes, test_size=0.3, random_state=20)
+    # Duplicate rows become sample weights; the fitted tree is unchanged
+    x_unique, y_unique, weights = binary_data.compact(x_train, y_train)
+    clf = DecisionTreeClassifier()
+    clf.fit(x_unique, training.classes[y_unique], sample_weight=weights)
+    disease_symptoms = {}
+    for code, disease in enumerate(training.classes):
+        rows = x[training.codes == code]
+        disease_symptoms[disease.strip()] = np.flatnonzero(rows.max(axis=0)).astype(np.int16)
+    severity_dict, description_dict, precaution_dict = load_symptom_data()
+    artifact = ModelArtifact(FlatTree.from_classifier(clf), training.columns,
+                             SymptomCooccurrence(training.columns, x), disease_symptoms,
+                             severity_dict, description_dict, precaution_dict)
+    return artifact, clf
+
+
+class ModelStore:
+    def __init__(self, artifact_dir=ARTIFACT_DIR, source_files=SOURCE_FILES):
+        self.artifact_dir = artifact_dir
+        self.source_files = source_files
+        self._loaded = {}
+        self._classifiers = {}
+        self._lock = threading.Lock()
+
+    def data_hash(self):
+        digest = hashlib.sha256(f"v{ARTIFACT_VERSION}".encode('utf-8'))
+        for path in self.source_files:
+            digest.update(path.encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()[:16]
+
+    def artifact_path(self, key):
+        return os.path.join(self.artifact_dir, f"model_{key}.pkl")
+
+    def classifier_path(self, key):
+        return os.path.join(self.artifact_dir, f"model_{key}.clf.pkl")
+
+    def load(self, build=build_artifact):
+        key = self.data_hash()
+        with self._lock:
+            # Artifacts are shared read-only by every ChatBot in the process
+            if key in self._loaded:
+                return self._loaded[key]
+
+            start_time = time.time()
+            path = self.artifact_path(key)
+            artifact = None
+            if os.path.exists(path):
+                try:
+                    with open(path, 'rb') as f:
+                        artifact = pickle.load(f)
+                    logger.info(f"Loaded model artifact {path} in {time.time() - start_time:.3f} seconds")
+                except Exception as e:
+                    logger.warning(f"Could not load model artifact {path}, rebuilding: {e}")
+
+            if artifact is None:
+                artifact, clf = build()
+                self.save(artifact, path)
+                self.save(clf, self.classifier_path(key))
+                logger.info(f"Built model artifact {path} in {time.time() - start_time:.3f} seconds")
+
+            self._loaded[key] = artifact
+            return artifact
+
+    def load_classifier(self, build=build_artifact):
+        # The fitted sklearn tree is kept in its own file so that serving,
+        # which only needs the FlatTree, never imports sklearn.
+        key = self.data_hash()
+        path = self.classifier_path(key)
+        if not os.path.exists(path):
+            # Rebuild both files so the classifier matches the saved FlatTree
+            with self._lock:
+                artifact, clf = build()
+                self.save(artifact, self.artifact_path(key))
+                self.save(clf, path)
+                self._loaded[key] = artifact
+            return clf
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def classifier_for(self, artifact):
+        # The sklearn tree saved next to a loaded artifact, unpickled on first
+        # use and kept; None when its file is missing
+        with self._lock:
+            key = next(key for key, loaded in self._loaded.items() if loaded is artifact)
+            if key not in self._classifiers:
+                path = self.classifier_path(key)
+                if not os.path.exists(path):
+                    return None
+                with open(path, 'rb') as f:
+                    self._classifiers[key] = pickle.load(f)
+            return self._classifiers[key]
+
+    def save(self, obj, path):
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+
+model_store = ModelStore()
@@ -1,5 +1,5 @@
 import os
-import aiohttp
+from http_client import http_client
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,12 +20,11 @@ class NutritionAPI:
         url = f"{self.BASE_URL}/natural/nutrients"
         data = {"query": query}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=self.headers, json=data) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    return None
+        async with http_client.post(url, headers=self.headers, json=data) as response:
+            if response.status == 200:
+                return await response.json()
+            else:
+                return None
 
     def format_nutrition_data(self, data):
         if not data or 'foods' not in data or not data['foods']:
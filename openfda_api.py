@@ -1,17 +1,39 @@
-import aiohttp
+from http_client import http_client
+from cache import TTLCache, normalize_key
+from knowledge_snapshot import knowledge
+
+# Parsed label fields per brand name; unknown names are remembered for an hour
+drug_cache = TTLCache('openfda', maxsize=2048, ttl=86400, negative_ttl=3600)
+
+
+class OpenFDAError(Exception):
+    pass
+
 
 class OpenFDAAPI:
     BASE_URL = "https://api.fda.gov/drug/label.json"
 
-    def __init__(self, session):
+    def __init__(self, session=None):
         self.session = session
 
     async def get_drug_info(self, drug_name):
+        label = knowledge.get_drug(drug_name)
+        if label is not None:
+            return label
+        try:
+            return await drug_cache.get_or_fetch(
+                normalize_key(drug_name),
+                lambda: self.fetch_drug_info(drug_name),
+                refresh=lambda: OpenFDAAPI().fetch_drug_info(drug_name))
+        except OpenFDAError:
+            return None
+
+    async def fetch_drug_info(self, drug_name):
         params = {
             "search": f"openfda.brand_name:{drug_name}",
             "limit": 1
         }
-        async with self.session.get(self.BASE_URL, params=params) as response:
+        async with (self.session or http_client).get(self.BASE_URL, params=params) as response:
             if response.status == 200:
                 data = await response.json()
                 if data['results']:
@@ -23,8 +45,7 @@ class OpenFDAAPI:
                         "warnings": result.get('warnings', [None])[0],
                         "dosage_and_administration": result.get('dosage_and_administration', [None])[0]
                     }
+            elif response.status != 404:
+                # Rate limits and server errors are not cached as "no such drug"
+                raise OpenFDAError(f"OpenFDA returned HTTP {response.status}")
             return None
-
-
-
-
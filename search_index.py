@@ -0,0 +1,254 @@
+import csv
+import logging
+import math
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+from nltk.stem import PorterStemmer
+
+from api_integration import disease_cache, has_disease_info
+from cache import normalize_key
+from knowledge_snapshot import knowledge
+from model_store import DESCRIPTION_FILE, PRECAUTION_FILE
+from openfda_api import drug_cache
+
+logger = logging.getLogger(__name__)
+
+INDEX_REFRESH = int(os.getenv("SEARCH_INDEX_REFRESH", 600))
+TITLE_WEIGHT = 3
+# Share of the query's words a title has to account for to answer it
+MIN_COVERAGE = 0.5
+
+# Dropped for ranking only; titles keep every term so "Hepatitis A" stays
+# distinct from "Hepatitis B"
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it me my of on or
+tell the this to what when which who why with about
+""".split())
+
+_stemmer = PorterStemmer()
+
+
+@lru_cache(maxsize=65536)
+def stem(word):
+    return _stemmer.stem(word)
+
+
+def words(text):
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+
+def terms(text):
+    return [stem(word) for word in words(text)]
+
+
+def _same_word(query_word, title_word):
+    # Exact words only, plus a plain plural in the query. Stems are too
+    # loose here: "aid" and "aids" share one.
+    return query_word in (title_word, title_word + 's', title_word + 'es')
+
+
+def phrase_at(query_words, title_words, same=_same_word):
+    # Start of the first run of query words spelling out the title, or -1
+    for start in range(len(query_words) - len(title_words) + 1):
+        if all(same(query_words[start + i], word) for i, word in enumerate(title_words)):
+            return start
+    return -1
+
+
+class Document:
+    __slots__ = ('key', 'kind', 'title', 'title_words', 'text', 'answer')
+
+    def __init__(self, kind, title, text, answer):
+        self.key = (kind, normalize_key(title))
+        self.kind = kind
+        self.title = title
+        self.title_words = tuple(words(title))
+        self.text = text
+        self.answer = answer
+
+
+class SearchIndex:
+    # Inverted index with Okapi BM25. Documents are added, then freeze()
+    # turns term frequencies into per-posting weights, so a query only sums
+    # precomputed floats. A frozen index is never modified again.
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents = []
+        self.postings = {}
+        self._lengths = []
+
+    def add(self, document):
+        doc_id = len(self.documents)
+        self.documents.append(document)
+        counts = {}
+        for term in terms(document.title):
+            if term not in STOPWORDS:
+                counts[term] = counts.get(term, 0) + TITLE_WEIGHT
+        for term in terms(document.text):
+            if term not in STOPWORDS:
+                counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            self.postings.setdefault(term, []).append((doc_id, count))
+        self._lengths.append(sum(counts.values()))
+
+    def freeze(self):
+        total = len(self.documents)
+        average = sum(self._lengths) / total if total else 1.0
+        for term, postings in self.postings.items():
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            self.postings[term] = [
+                (doc_id, idf * count * (self.k1 + 1) /
+                 (count + self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average)))
+                for doc_id, count in postings]
+        self._lengths = None
+        return self
+
+    def search(self, query_terms, limit=10):
+        scores = {}
+        for term in set(query_terms):
+            if term in STOPWORDS:
+                continue
+            for doc_id, weight in self.postings.get(term, ()):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(self.documents[doc_id], score) for doc_id, score in ranked]
+
+
+def _disease_answer(title, summary):
+    # Same shape as a MedlinePlus answer, so the same formatting applies
+    return f"Title: {title}\nSummary: {summary}"
+
+
+def collect_documents():
+    documents = {}
+
+    def add(document):
+        # Later sources replace earlier ones for the same title
+        documents[document.key] = document
+
+    precautions = {}
+    with open(PRECAUTION_FILE, encoding='utf-8') as csv_file:
+        for row in csv.reader(csv_file):
+            if len(row) >= 2:
+                precautions[row[0].strip()] = [step.strip() for step in row[1:] if step.strip()]
+    with open(DESCRIPTION_FILE, encoding='utf-8') as csv_file:
+        for row in csv.reader(csv_file):
+            if len(row) >= 2:
+                name = row[0].strip()
+                summary = row[1].strip()
+                if precautions.get(name):
+                    summary += f" Precautions: {', '.join(precautions[name])}."
+                add(Document('disease', name, summary, _disease_answer(name, summary)))
+
+    # Fetched MedlinePlus summaries are richer than the MasterData ones
+    for _, info in disease_cache.items() + knowledge.items('disease_topics'):
+        if has_disease_info(info) and info.startswith("Title: "):
+            title, _, summary = info.partition("\n")
+            add(Document('disease', title[len("Title: "):], summary, info))
+
+    for name, label in drug_cache.items() + knowledge.items('drug_labels'):
+        if label:
+            text = ' '.join(str(label.get(field) or '') for field in ('generic_name', 'indications_and_usage'))
+            add(Document('drug', label.get('brand_name') or name, text, label))
+    return list(documents.values())
+
+
+class KnowledgeIndex:
+    # Resolves "tell me about X" from local content. BM25 finds candidates,
+    # but a document answers a query only when the query names it: its
+    # title appears word for word in the query and covers at least
+    # MIN_COVERAGE of the query's words, or the query's words occur in a
+    # single title.
+    def __init__(self, refresh_interval=INDEX_REFRESH):
+        self.refresh_interval = refresh_interval
+        self._index = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+        self.build_ms = 0.0
+        self.queries = 0
+        self.resolved = 0
+        self.total_us = 0.0
+
+    def refresh(self):
+        start_time = time.perf_counter()
+        index = SearchIndex()
+        for document in collect_documents():
+            index.add(document)
+        self._index = index.freeze()
+        self._built_at = time.time()
+        self.build_ms = (time.perf_counter() - start_time) * 1000
+        logger.info(f"Search index built with {len(index.documents)} documents in {self.build_ms:.1f}ms")
+        return self._index
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Search index refresh failed: {e}")
+        finally:
+            self._refreshing = False
+
+    def _current(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    return self.refresh()
+        elif time.time() - self._built_at > self.refresh_interval:
+            with self._lock:
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh_in_background, name="search-index", daemon=True).start()
+        return self._index
+
+    def resolve(self, query):
+        # Returns ('disease' | 'drug', answer) or (None, None)
+        index = self._current()
+        start_time = time.perf_counter()
+        query_words = words(query)
+        content_words = [word for word in query_words if word not in STOPWORDS]
+        if not content_words:
+            return None, None
+        named = []
+        narrowed = {}
+        for document, score in index.search(terms(query)):
+            start = phrase_at(query_words, document.title_words)
+            if start >= 0:
+                covered = [word for word in query_words[start:start + len(document.title_words)] if word not in STOPWORDS]
+                if len(covered) >= MIN_COVERAGE * len(content_words):
+                    named.append((len(document.title_words), document.kind == 'disease', score, document))
+            elif phrase_at(document.title_words, content_words, same=str.__eq__) >= 0:
+                narrowed[document.key] = document
+        if named:
+            document = max(named, key=lambda match: match[:3])[3]
+        elif len(narrowed) == 1:
+            document = next(iter(narrowed.values()))
+        else:
+            document = None
+        self.queries += 1
+        self.total_us += (time.perf_counter() - start_time) * 1e6
+        if document is None:
+            return None, None
+        self.resolved += 1
+        return document.kind, document.answer
+
+    def stats(self):
+        index = self._index
+        return {
+            "documents": len(index.documents) if index else 0,
+            "terms": len(index.postings) if index else 0,
+            "builtAt": self._built_at or None,
+            "buildMs": round(self.build_ms, 1),
+            "queries": self.queries,
+            "resolved": self.resolved,
+            "avgQueryUs": round(self.total_us / self.queries, 1) if self.queries else 0.0,
+        }
+
+
+knowledge_index = KnowledgeIndex()
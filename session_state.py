@@ -0,0 +1,225 @@
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class ConversationState:
+    # Only the per-conversation fields; the model and knowledge base stay on
+    # the shared ChatBot.
+    __slots__ = ('symptom', 'days', 'additional_symptoms', 'related_symptoms', 'current_patient',
+                 'current_symptoms', 'symptom_candidates', 'diagnosis', 'diagnosis_time', 'state',
+                 'primary_choice')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.symptom = ""
+        self.days = 0
+        self.additional_symptoms = []
+        self.related_symptoms = []
+        self.current_patient = None
+        self.current_symptoms = []
+        self.symptom_candidates = []
+        self.diagnosis = None
+        self.diagnosis_time = None
+        self.state = "initial"
+        self.primary_choice = None
+
+    def snapshot(self):
+        # Same names as chat_state.json where they overlap; fields still at
+        # their defaults are left out to keep snapshots small
+        return {SNAPSHOT_KEYS.get(name, name): getattr(self, name) for name in self.__slots__
+                if getattr(self, name) != getattr(DEFAULT_STATE, name)}
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        state = cls()
+        for name in cls.__slots__:
+            key = SNAPSHOT_KEYS.get(name, name)
+            if key in snapshot:
+                setattr(state, name, snapshot[key])
+        return state
+
+
+SNAPSHOT_KEYS = {'current_symptoms': 'symptoms', 'state': 'current_question', 'current_patient': 'patient'}
+DEFAULT_STATE = ConversationState()
+
+
+def session_field(name):
+    # ChatBot attribute that reads and writes the bound ConversationState
+    return property(lambda self: getattr(self.session, name),
+                    lambda self, value: setattr(self.session, name, value))
+
+
+# Lease owner id of this worker process
+LEASE_OWNER = uuid.uuid4().hex
+LEASE_POLL = 0.005
+LEASE_POLL_MAX = 0.1
+# Trying the thread lock is cheap, so waiters retry it more often
+LOCK_POLL_MAX = 0.01
+
+
+class SessionLock:
+    # Flask runs every async view in its own event loop, so an asyncio.Lock
+    # cannot be shared between requests; a thread lock orders the turns
+    # within this process. With a store, a lease in it also keeps other
+    # worker processes out of the conversation until the turn is saved.
+    def __init__(self, store=None, key=None, lease_ttl=60):
+        self._lock = threading.Lock()
+        self.store = store
+        self.key = key
+        self.lease_ttl = lease_ttl
+
+    def locked(self):
+        return self._lock.locked()
+
+    def _acquire_lease(self):
+        return self.store is None or self.store.acquire(self.key, LEASE_OWNER, self.lease_ttl)
+
+    def _release_lease(self):
+        if self.store is not None:
+            self.store.release(self.key, LEASE_OWNER)
+
+    async def __aenter__(self):
+        # Polled like the lease, so a waiting request holds no executor
+        # thread and a cancelled one never ends up owning the lock
+        delay = LEASE_POLL
+        while not self._lock.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LOCK_POLL_MAX)
+        try:
+            delay = LEASE_POLL
+            while not self._acquire_lease():
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, LEASE_POLL_MAX)
+        except BaseException:
+            self._lock.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        try:
+            self._release_lease()
+        finally:
+            self._lock.release()
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            delay = LEASE_POLL
+            while not self._acquire_lease():
+                time.sleep(delay)
+                delay = min(delay * 2, LEASE_POLL_MAX)
+        except BaseException:
+            self._lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self._release_lease()
+        finally:
+            self._lock.release()
+
+
+class Session:
+    __slots__ = ('sid', 'state', 'lock', 'last_seen')
+
+    def __init__(self, sid, store=None, lease_ttl=60):
+        self.sid = sid
+        self.state = ConversationState()
+        self.lock = SessionLock(store, f"conversation:{sid}", lease_ttl)
+        self.last_seen = time.monotonic()
+
+
+class SessionManager:
+    # Live conversations keyed by session id, least recently used first. With
+    # a shared store, state is loaded before and saved after every turn so
+    # any worker process can serve the next one, and the session lock holds
+    # a lease in the store so two workers never run one conversation's
+    # turns at once. `lease_ttl` bounds how long a crashed worker blocks it.
+    def __init__(self, max_sessions=10000, idle_ttl=1800, store=None, lease_ttl=60):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.store = store
+        self.lease_ttl = lease_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.evicted = 0
+        self.expired = 0
+        self.loads = 0
+        self.saves = 0
+        self.store_ms = 0.0
+
+    def get(self, sid):
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is None or now - session.last_seen > self.idle_ttl:
+                if session is not None:
+                    self.expired += 1
+                session = Session(sid, self.store, self.lease_ttl)
+                self._sessions[sid] = session
+                self.created += 1
+            session.last_seen = now
+            self._sessions.move_to_end(sid)
+            self._evict(now)
+            return session
+
+    def drop(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+        if self.store:
+            self.store.delete(f"conversation:{sid}")
+
+    def load(self, session):
+        if self.store is None:
+            return session.state
+        start_time = time.perf_counter()
+        snapshot = self.store.get(f"conversation:{session.sid}")
+        session.state = ConversationState.from_snapshot(snapshot) if snapshot else ConversationState()
+        self.loads += 1
+        self.store_ms += (time.perf_counter() - start_time) * 1000
+        return session.state
+
+    def save(self, session):
+        if self.store is None:
+            return
+        start_time = time.perf_counter()
+        self.store.put(f"conversation:{session.sid}", session.state.snapshot(), ttl=self.idle_ttl)
+        self.saves += 1
+        self.store_ms += (time.perf_counter() - start_time) * 1000
+
+    def _evict(self, now):
+        while self._sessions:
+            sid, session = next(iter(self._sessions.items()))
+            if now - session.last_seen > self.idle_ttl:
+                self.expired += 1
+            elif len(self._sessions) > self.max_sessions:
+                self.evicted += 1
+            else:
+                break
+            del self._sessions[sid]
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        with self._lock:
+            self._evict(time.monotonic())
+            return {
+                "live": len(self._sessions),
+                "busy": sum(1 for session in self._sessions.values() if session.lock.locked()),
+                "capacity": self.max_sessions,
+                "idleTtlSeconds": self.idle_ttl,
+                "created": self.created,
+                "evicted": self.evicted,
+                "expired": self.expired,
+                "store": type(self.store).__name__ if self.store else None,
+                "avgStoreMs": round(self.store_ms / (self.loads + self.saves), 3) if self.loads + self.saves else 0.0,
+            }
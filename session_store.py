@@ -0,0 +1,172 @@
+import json
+import threading
+import time
+
+from database import Database
+
+SESSION_DB = 'sessions.db'
+
+
+def dumps(value):
+    return json.dumps(value, separators=(',', ':'))
+
+
+def _expires_at(ttl):
+    return time.time() + ttl if ttl else None
+
+
+class MemorySessionStore:
+    # Process-local store; values are kept serialized so callers never share
+    # mutable objects with the store, same as with the SQLite backend.
+    def __init__(self):
+        self._data = {}
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+        return json.loads(value)
+
+    def put(self, key, value, ttl=None):
+        value = dumps(value)
+        with self._lock:
+            self._data[key] = (value, _expires_at(ttl))
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def items(self, prefix):
+        now = time.time()
+        with self._lock:
+            found = [(key, value) for key, (value, expires_at) in self._data.items()
+                     if key.startswith(prefix) and (expires_at is None or expires_at >= now)]
+        return [(key[len(prefix):], json.loads(value)) for key, value in sorted(found)]
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._data if key.startswith(prefix)]:
+                del self._data[key]
+
+    def purge(self):
+        now = time.time()
+        with self._lock:
+            for key in [key for key, (_, expires_at) in self._data.items() if expires_at is not None and expires_at < now]:
+                del self._data[key]
+
+    def acquire(self, key, owner, ttl):
+        # Leases only matter between processes, which cannot share this store
+        now = time.time()
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None and lease[0] != owner and lease[1] >= now:
+                return False
+            self._leases[key] = (owner, now + ttl)
+            return True
+
+    def release(self, key, owner):
+        with self._lock:
+            if self._leases.get(key, (None,))[0] == owner:
+                del self._leases[key]
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionStore:
+    # Key-value table in a local SQLite file (WAL), shared by every worker
+    # process on the host.
+    def __init__(self, db_name=SESSION_DB, purge_every=1000):
+        self.db = Database(db_name)
+        self.purge_every = purge_every
+        self._puts = 0
+        connection = self.db.get_connection()
+        connection.execute('''
+        CREATE TABLE IF NOT EXISTS session_kv (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL
+        ) WITHOUT ROWID
+        ''')
+        connection.execute('''
+        CREATE TABLE IF NOT EXISTS session_leases (
+            key TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+        ''')
+        connection.commit()
+
+    def get(self, key):
+        row = self.db.get_connection().execute('SELECT value, expires_at FROM session_kv WHERE key = ?', (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def put(self, key, value, ttl=None):
+        connection = self.db.get_connection()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO session_kv (key, value, expires_at) VALUES (?, ?, ?)',
+                               (key, dumps(value), _expires_at(ttl)))
+        self._puts += 1
+        if self._puts % self.purge_every == 0:
+            self.purge()
+
+    def delete(self, key):
+        connection = self.db.get_connection()
+        with connection:
+            connection.execute('DELETE FROM session_kv WHERE key = ?', (key,))
+
+    def items(self, prefix):
+        # Range scan on the primary key instead of LIKE, which would need escaping
+        rows = self.db.get_connection().execute(
+            'SELECT key, value FROM session_kv WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at >= ?) ORDER BY key',
+            (prefix, prefix + '\uffff', time.time()))
+        return [(key[len(prefix):], json.loads(value)) for key, value in rows]
+
+    def delete_prefix(self, prefix):
+        connection = self.db.get_connection()
+        with connection:
+            connection.execute('DELETE FROM session_kv WHERE key >= ? AND key < ?', (prefix, prefix + '\uffff'))
+
+    def purge(self):
+        connection = self.db.get_connection()
+        with connection:
+            connection.execute('DELETE FROM session_kv WHERE expires_at < ?', (time.time(),))
+            connection.execute('DELETE FROM session_leases WHERE expires_at < ?', (time.time(),))
+
+    def acquire(self, key, owner, ttl):
+        # Cross-process mutex: the row is taken over only once it has expired,
+        # so a worker that died holding it blocks others for at most `ttl`
+        now = time.time()
+        connection = self.db.get_connection()
+        with connection:
+            cursor = connection.execute(
+                'INSERT INTO session_leases (key, owner, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at '
+                'WHERE session_leases.owner = excluded.owner OR session_leases.expires_at < ?',
+                (key, owner, now + ttl, now))
+        return cursor.rowcount == 1
+
+    def release(self, key, owner):
+        connection = self.db.get_connection()
+        with connection:
+            connection.execute('DELETE FROM session_leases WHERE key = ? AND owner = ?', (key, owner))
+
+    def close(self):
+        self.db.close()
+
+
+def create_session_store(backend):
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    raise ValueError(f"Unknown session store backend: {backend}")
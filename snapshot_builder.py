@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import binary_data
+from api_integration import MedlinePlusAPI, has_disease_info
+from knowledge_snapshot import knowledge
+from medication_api import MedicationAPI
+from openfda_api import OpenFDAAPI
+
+logger = logging.getLogger(__name__)
+
+REFRESH_HOURS = float(os.getenv("KNOWLEDGE_REFRESH_HOURS", 24))
+BUILD_CONCURRENCY = 4
+
+
+def training_diseases():
+    # The prognosis labels the model can predict
+    return [name.strip() for name in binary_data.load('training', rebuild=False).classes]
+
+
+def read_names(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+async def build(snapshot=knowledge, diseases=None, drugs=(), concurrency=BUILD_CONCURRENCY):
+    # Fetches straight from the APIs, bypassing the snapshot and the caches.
+    # Only answers with content are stored, so a failed or empty fetch
+    # leaves the previous snapshot entry in place.
+    start_time = time.time()
+    diseases = training_diseases() if diseases is None else diseases
+    drugs = set(drugs)
+    counts = {"diseases": 0, "medicines": 0, "drugs": 0, "rxnorm": 0, "errors": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def step(kind, fetch, name):
+        async with semaphore:
+            try:
+                return await fetch(name)
+            except Exception as e:
+                counts["errors"] += 1
+                logger.warning(f"Snapshot {kind} fetch for '{name}' failed: {e}")
+                return None
+
+    async def disease(name):
+        info, medicines = await asyncio.gather(
+            step("disease", MedlinePlusAPI().fetch_disease_info, name),
+            step("medicines", MedicationAPI().fetch_medicines_for_disease, name))
+        if info and has_disease_info(info):
+            snapshot.put_disease(name, info)
+            counts["diseases"] += 1
+        if medicines:
+            snapshot.put_medicines(name, medicines)
+            counts["medicines"] += 1
+            # Labels of the drugs offered for a disease are the likely next question
+            drugs.update(medicine['name'] for medicine in medicines if medicine['name'] != 'N/A')
+
+    async def drug(name):
+        label, rxnorm = await asyncio.gather(
+            step("drug", OpenFDAAPI().fetch_drug_info, name),
+            step("rxnorm", MedicationAPI().get_rxnorm_info, name))
+        if label:
+            snapshot.put_drug(name, label)
+            counts["drugs"] += 1
+        if rxnorm:
+            counts["rxnorm"] += 1
+
+    await asyncio.gather(*(disease(name) for name in diseases))
+    await asyncio.gather(*(drug(name) for name in sorted(drugs)))
+
+    counts.update({"builtAt": time.time(), "seconds": round(time.time() - start_time, 1)})
+    snapshot.set_meta('last_build', counts)
+    logger.info(f"Knowledge snapshot built: {counts}")
+    return counts
+
+
+class SnapshotRefresher:
+    # Rebuilds the snapshot every `interval` seconds on a daemon thread.
+    # Once started, it builds right away only when the last build is due.
+    def __init__(self, snapshot=knowledge, interval=REFRESH_HOURS * 3600, drugs=()):
+        self.snapshot = snapshot
+        self.interval = interval
+        self.drugs = drugs
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _next_delay(self):
+        last_build = self.snapshot.get_meta('last_build')
+        if not last_build:
+            return 0
+        return max(0, last_build['builtAt'] + self.interval - time.time())
+
+    def _run(self):
+        while not self._stop.wait(self._next_delay()):
+            try:
+                if self.snapshot.claim_build(self.interval):
+                    asyncio.run(build(self.snapshot, drugs=self.drugs))
+                else:
+                    # Another process is building; check again after it should be done
+                    self._stop.wait(min(self.interval, 3600))
+            except Exception as e:
+                logger.error(f"Knowledge snapshot refresh failed: {e}")
+                self._stop.wait(min(self.interval, 3600))
+
+    def start(self):
+        # Safe to call on every request; only the first call starts the thread
+        if self.interval <= 0 or self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="knowledge-refresh", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    # python snapshot_builder.py [--drugs drugs.txt] [--disease NAME ...]
+    # Meant to be run from cron; the app can also refresh on its own with
+    # KNOWLEDGE_REFRESH_HOURS set.
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build the local knowledge snapshot")
+    parser.add_argument('--drugs', help="file with one drug name per line to include")
+    parser.add_argument('--disease', action='append', help="disease to include (default: every training label)")
+    args = parser.parse_args()
+    counts = asyncio.run(build(diseases=args.disease, drugs=read_names(args.drugs) if args.drugs else ()))
+    print(f"Snapshot: {counts}")
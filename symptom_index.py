@@ -0,0 +1,30 @@
+import numpy as np
+
+
+class SymptomCooccurrence:
+    def __init__(self, columns, rows, top_k=10):
+        self.columns = list(columns)
+        self.index = {symptom: i for i, symptom in enumerate(self.columns)}
+        self.top_k = top_k
+
+        # One row per training record, one column per symptom (0/1)
+        counts = np.asarray(rows, dtype=np.int32)
+        # matrix[i, j] = number of records where symptoms i and j appear together
+        self.matrix = counts.T @ counts
+
+        self.ranked_names = []
+        for i in range(len(self.columns)):
+            row = self.matrix[i].copy()
+            row[i] = 0
+            self.ranked_names.append([self.columns[j] for j in self._rank(row, top_k)])
+
+    def _rank(self, counts, k):
+        order = np.argsort(-counts, kind='stable')[:k]
+        return order[counts[order] > 0]
+
+    def related(self, symptom, k=None):
+        i = self.index.get(symptom)
+        if i is None:
+            return []
+        names = self.ranked_names[i]
+        return list(names if k is None else names[:k])
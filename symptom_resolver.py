@@ -0,0 +1,164 @@
+import re
+from collections import defaultdict
+
+# Everyday phrasings mapped onto the training column names
+SYNONYMS = {
+    "stomach ache": "stomach_pain",
+    "stomachache": "stomach_pain",
+    "tummy ache": "stomach_pain",
+    "belly ache": "belly_pain",
+    "rash": "skin_rash",
+    "itchy": "itching",
+    "itch": "itching",
+    "fever": "high_fever",
+    "temperature": "high_fever",
+    "low grade fever": "mild_fever",
+    "throwing up": "vomiting",
+    "puking": "vomiting",
+    "vomit": "vomiting",
+    "nauseous": "nausea",
+    "nauseated": "nausea",
+    "tired": "fatigue",
+    "tiredness": "fatigue",
+    "exhaustion": "fatigue",
+    "coughing": "cough",
+    "sneezing": "continuous_sneezing",
+    "dizzy": "dizziness",
+    "short of breath": "breathlessness",
+    "shortness of breath": "breathlessness",
+    "difficulty breathing": "breathlessness",
+    "diarrhea": "diarrhoea",
+    "loose motions": "diarrhoea",
+    "heartburn": "acidity",
+    "body ache": "muscle_pain",
+    "body pain": "muscle_pain",
+    "muscle ache": "muscle_pain",
+    "sore throat": "throat_irritation",
+    "blocked nose": "congestion",
+    "stuffy nose": "congestion",
+    "jaundice": "yellowish_skin",
+    "yellow skin": "yellowish_skin",
+    "burning urination": "burning_micturition",
+    "painful urination": "burning_micturition",
+    "frequent urination": "polyuria",
+    "palpitation": "palpitations",
+    "pimples": "pus_filled_pimples",
+    "acne": "pus_filled_pimples",
+    "cramp": "cramps",
+    "anxious": "anxiety",
+    "depressed": "depression",
+    "blurry vision": "blurred_and_distorted_vision",
+    "blurred vision": "blurred_and_distorted_vision",
+    "chest ache": "chest_pain",
+    "backache": "back_pain",
+    "back ache": "back_pain",
+    "shaking": "shivering",
+    "constipated": "constipation",
+    "sweaty": "sweating",
+    "swollen lymph nodes": "swelled_lymph_nodes",
+}
+
+STOPWORDS = {
+    "i", "im", "a", "an", "the", "in", "of", "on", "my", "and", "am", "have", "has", "having",
+    "feel", "feeling", "some", "from", "with", "been", "is", "it", "very", "bad", "lot", "since",
+}
+
+
+def normalize(text):
+    text = re.sub(r'\.\d+$', '', text.strip().lower())  # pandas suffix on duplicate columns
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text).split())
+
+
+def _stem(token):
+    if token.endswith('ing') and len(token) > 5:
+        return token[:-3]
+    if token.endswith('s') and not token.endswith('ss') and len(token) > 3:
+        return token[:-1]
+    return token
+
+
+def _tokens(text):
+    return {_stem(token) for token in text.split() if token not in STOPWORDS}
+
+
+def _trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SymptomResolver:
+    def __init__(self, columns, synonyms=SYNONYMS, accept_score=0.8, min_margin=0.15, min_score=0.35):
+        self.columns = list(columns)
+        self.accept_score = accept_score
+        self.min_margin = min_margin
+        self.min_score = min_score
+
+        self.exact = {}
+        self.column_grams = []
+        self.column_tokens = []
+        gram_index = defaultdict(list)
+        for i, column in enumerate(self.columns):
+            name = normalize(column)
+            self.exact.setdefault(name, column)
+            self.exact.setdefault(name.replace(' ', ''), column)
+            grams = _trigrams(name)
+            self.column_grams.append(len(grams))
+            self.column_tokens.append(_tokens(name))
+            for gram in grams:
+                gram_index[gram].append(i)
+        self.gram_index = dict(gram_index)
+
+        known = set(self.columns)
+        for phrase, column in synonyms.items():
+            if column in known:
+                self.exact.setdefault(normalize(phrase), column)
+
+        # Longest phrases first so "low grade fever" wins over "fever"
+        self.phrases = sorted(((f" {name} ", column) for name, column in self.exact.items() if ' ' in name or len(name) > 3),
+                              key=lambda item: -len(item[0]))
+
+    def resolve(self, text, limit=5):
+        name = normalize(text)
+        if not name:
+            return []
+        core = ' '.join(token for token in name.split() if token not in STOPWORDS)
+        for candidate in (name, name.replace(' ', ''), core, core.replace(' ', '')):
+            if candidate in self.exact:
+                return [(self.exact[candidate], 1.0)]
+
+        scores = {}
+        padded = f" {name} "
+        for phrase, column in self.phrases:
+            if phrase in padded:
+                scores[column] = 0.9
+                break
+
+        grams = _trigrams(core or name)
+        shared = defaultdict(int)
+        for gram in grams:
+            for i in self.gram_index.get(gram, ()):
+                shared[i] += 1
+
+        query_tokens = _tokens(name)
+        for i, count in shared.items():
+            dice = 2.0 * count / (len(grams) + self.column_grams[i])
+            tokens = self.column_tokens[i]
+            overlap = len(query_tokens & tokens) / max(len(query_tokens), len(tokens)) if query_tokens and tokens else 0.0
+            score = round(0.5 * dice + 0.5 * overlap, 3)
+            column = self.columns[i]
+            if score >= self.min_score and score > scores.get(column, 0.0):
+                scores[column] = score
+
+        return sorted(scores.items(), key=lambda item: -item[1])[:limit]
+
+    def pick(self, matches):
+        # A single confident match is accepted; anything else is ambiguous
+        if not matches:
+            return None
+        column, score = matches[0]
+        if score >= 1.0:
+            return column
+        runner_up = matches[1][1] if len(matches) > 1 else 0.0
+        if score >= self.accept_score and score - runner_up >= self.min_margin:
+            return column
+        return None
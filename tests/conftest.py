@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    # Modules read Data/ and MasterData/ relative to the repository root
+    monkeypatch.chdir(ROOT)
+
+
+def _dataset(name):
+    # Absolute paths: a session fixture may run before repo_root changes directory
+    import binary_data
+    return binary_data.load(name, os.path.join(ROOT, binary_data.DATASETS[name]),
+                            os.path.join(ROOT, binary_data.BIN_DIR))
+
+
+@pytest.fixture(scope="session")
+def training():
+    return _dataset('training')
+
+
+@pytest.fixture(scope="session")
+def testing():
+    return _dataset('testing')
@@ -0,0 +1,89 @@
+import importlib
+import os
+
+import numpy as np
+import pytest
+
+from archive_manager import ArchiveManager
+from database import SQLiteHistory
+from history_log import HistoryView
+from history_writer import HistoryWriter
+from session_store import MemorySessionStore
+
+
+@pytest.fixture(scope="module")
+def app_module():
+    # No background snapshot builds (and so no API calls) during the tests
+    os.environ.setdefault("KNOWLEDGE_REFRESH_HOURS", "0")
+    os.environ.setdefault("SESSION_STORE", "memory")
+    return importlib.import_module("app")
+
+
+@pytest.fixture
+def client(app_module, tmp_path, monkeypatch):
+    # Archives, chat history and sessions go to tmp_path, never to the
+    # databases in the repo root
+    monkeypatch.setattr(app_module, 'archives', ArchiveManager(str(tmp_path / "archives.db")))
+    monkeypatch.setattr(app_module, 'session_store', MemorySessionStore())
+    store = SQLiteHistory(str(tmp_path / "history.db"))
+    store.load()
+    writer = HistoryWriter(store)
+    chatbot = app_module.chatbot
+    monkeypatch.setattr(chatbot, 'history_store', store)
+    monkeypatch.setattr(chatbot, 'history_writer', writer)
+    monkeypatch.setattr(chatbot, 'conversation_history', HistoryView(store, before_read=writer.flush))
+    yield app_module.app.test_client()
+    writer.close()
+
+
+@pytest.mark.parametrize('route', ['/save_chat_history', '/auto_save_chat_history'])
+@pytest.mark.parametrize('body', [{"history": "hello"}, {"history": {"0": "hi"}}, {"history": None}, {}, ["hi"]])
+def test_non_list_history_is_rejected(client, route, body):
+    response = client.post(route, json=body)
+    assert response.status_code == 400
+
+
+def test_saved_history_is_archived(client):
+    history = [{"sender": "user", "text": "hi"}, {"sender": "bot", "text": "hello"}, {"sender": "user", "text": "bye"}]
+    assert client.post('/save_chat_history', json={"history": history}).status_code == 200
+    chats = client.get('/get_archived_chats').get_json()
+    assert len(chats) == 1
+    assert client.get(f"/get_archived_chat/{chats[0]['id']}").get_json() == history
+
+
+def test_batch_without_known_symptoms_has_no_prognosis(client):
+    response = client.post('/predict_batch', json={"symptomSets": [[], ["not a symptom"], ["itching", "skin_rash"]]})
+    assert response.status_code == 200
+    empty, unknown, known = response.get_json()["results"]
+    assert empty["prognosis"] is None
+    assert unknown["prognosis"] is None
+    assert unknown["unknownSymptoms"] == ["not a symptom"]
+    assert known["prognosis"] is not None
+    assert known["symptoms"] == ["itching", "skin_rash"]
+
+
+def test_large_batch_matches_small_batches(client, app_module):
+    from chatbot import SKLEARN_BATCH_ROWS
+    columns = sorted(app_module.chatbot.symptom_index)
+    rng = np.random.default_rng(0)
+    symptom_sets = [list(rng.choice(columns, size=int(rng.integers(1, 8)), replace=False))
+                    for _ in range(SKLEARN_BATCH_ROWS)]
+    large = client.post('/predict_batch', json={"symptomSets": symptom_sets}).get_json()["results"]
+    small = [result for start in range(0, len(symptom_sets), 500)
+             for result in client.post('/predict_batch', json={"symptomSets": symptom_sets[start:start + 500]}).get_json()["results"]]
+    assert [result["prognosis"] for result in large] == [result["prognosis"] for result in small]
+
+
+def test_snapshot_refresher_starts_with_the_first_request(client, app_module, monkeypatch):
+    from snapshot_builder import SnapshotRefresher
+    assert app_module.snapshot_refresher._thread is None
+
+    runs = []
+    refresher = SnapshotRefresher(interval=3600)
+    monkeypatch.setattr(refresher, '_run', lambda: runs.append(1))
+    monkeypatch.setattr(app_module, 'snapshot_refresher', refresher)
+    assert refresher._thread is None
+    client.get('/get_archived_chats')
+    client.get('/get_archived_chats')
+    refresher._thread.join(1)
+    assert runs == [1]
@@ -0,0 +1,58 @@
+from archive_manager import ArchiveManager
+
+
+def chat(n):
+    return [{"role": "user", "text": f"question {n}"}, {"role": "bot", "text": f"answer {n}"},
+            {"role": "user", "text": "thanks"}]
+
+
+def test_archives_are_shared_between_workers(tmp_path):
+    db = str(tmp_path / "archives.db")
+    first, second = ArchiveManager(db), ArchiveManager(db)
+    first_id = first.add("ann", chat(1), timestamp="t1")
+    second_id = first.add("ann", chat(2), timestamp="t2")
+
+    assert second.has_user("ann")
+    assert not second.has_user("bob")
+    assert second.list("ann") == [{'id': first_id, 'timestamp': "t1"}, {'id': second_id, 'timestamp': "t2"}]
+    assert second.previews("ann")[1] == {'id': second_id, 'timestamp': "t2", 'messages': chat(2)[:2]}
+    assert second.get("ann", second_id) == chat(2)
+    assert second.stats()["pageIns"] == 1
+
+
+def test_ids_are_stable_and_belong_to_one_user(tmp_path):
+    archives = ArchiveManager(str(tmp_path / "archives.db"))
+    ann_id = archives.add("ann", chat(1))
+    listed = archives.list("ann")
+    for n in range(60):
+        archives.add("ann", chat(n))
+    bob_id = archives.add("bob", chat(99))
+
+    # Nothing is dropped, and an id keeps naming the same chat
+    assert len(archives.list("ann")) == 61
+    assert archives.list("ann")[0] == listed[0]
+    assert archives.get("ann", ann_id) == chat(1)
+    assert archives.get("ann", bob_id) is None
+    assert archives.get("bob", ann_id) is None
+    assert archives.get("ann", 10 ** 6) is None
+
+
+def test_stats_totals_count_every_worker(tmp_path):
+    db = str(tmp_path / "archives.db")
+    first, second = ArchiveManager(db), ArchiveManager(db)
+    first.add("ann", chat(1))
+    second.add("ann", chat(2))
+    second.add("bob", chat(3))
+    stats = ArchiveManager(db).stats()
+    assert (stats["users"], stats["archives"]) == (2, 3)
+    assert stats["storedBytes"] == first.db.get_connection().execute(
+        'SELECT SUM(LENGTH(payload)) FROM chat_archives').fetchone()[0]
+
+
+def test_resident_payloads_stay_within_budget(tmp_path):
+    archives = ArchiveManager(str(tmp_path / "archives.db"), memory_budget=200)
+    ids = [archives.add("ann", chat(n)) for n in range(5)]
+    stats = archives.stats()
+    assert stats["residentBytes"] <= 200
+    assert stats["evictions"] > 0
+    assert archives.get("ann", ids[0]) == chat(0)
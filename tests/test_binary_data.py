@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn.tree import DecisionTreeClassifier
+
+import binary_data
+
+
+def test_compact_merges_duplicate_rows_into_weights():
+    x = np.array([[1, 0], [1, 0], [0, 1], [1, 0]], dtype=np.uint8)
+    codes = np.array([0, 0, 1, 1])
+    x_compact, y_compact, weights = binary_data.compact(x, codes)
+    assert sorted(zip(map(tuple, x_compact), y_compact, weights)) == [((0, 1), 1, 1.0), ((1, 0), 0, 2.0), ((1, 0), 1, 1.0)]
+
+
+def test_compaction_leaves_the_fitted_tree_unchanged(training, testing):
+    full_clf = DecisionTreeClassifier(random_state=0).fit(training.x, training.codes)
+    x_compact, y_compact, weights = binary_data.compact(training.x, training.codes)
+    compact_clf = DecisionTreeClassifier(random_state=0).fit(x_compact, y_compact, sample_weight=weights)
+    assert len(x_compact) < len(training.x)
+
+    assert (compact_clf.predict(testing.x) == full_clf.predict(testing.x)).all()
+    full_acc = (training.classes[full_clf.predict(testing.x)] == testing.y).mean()
+    compact_acc = (training.classes[compact_clf.predict(testing.x)] == testing.y).mean()
+    assert compact_acc == full_acc
+
+    rng = np.random.default_rng(0)
+    x = (rng.random((2000, len(training.columns))) < 0.05).astype(np.uint8)
+    assert (compact_clf.predict(x) == full_clf.predict(x)).all()
+
+
+CSV = "itching,skin_rash,cough,prognosis\n1,1,0,Fungal infection\n0,0,1,Common Cold\n1,0,0,Fungal infection\n"
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "small.csv"
+    path.write_text(CSV)
+    return str(path)
+
+
+def fail_hash(path):
+    raise AssertionError(f"{path} was hashed")
+
+
+def test_unchanged_csv_is_not_hashed(csv_path, tmp_path, monkeypatch):
+    built = binary_data.build('small', csv_path, str(tmp_path / "bin"))
+    monkeypatch.setattr(binary_data, 'file_sha256', fail_hash)
+    loaded = binary_data.load('small', csv_path, str(tmp_path / "bin"))
+    assert loaded.columns == built.columns == ["itching", "skin_rash", "cough"]
+    assert (loaded.x == built.x).all()
+    assert list(loaded.y) == ["Fungal infection", "Common Cold", "Fungal infection"]
+
+
+def test_touched_csv_is_hashed_once(csv_path, tmp_path, monkeypatch):
+    bin_dir = str(tmp_path / "bin")
+    binary_data.build('small', csv_path, bin_dir)
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    hashed = []
+    file_sha256 = binary_data.file_sha256
+    monkeypatch.setattr(binary_data, 'file_sha256', lambda path: hashed.append(path) or file_sha256(path))
+    assert not binary_data.is_stale('small', csv_path, bin_dir)
+    assert not binary_data.is_stale('small', csv_path, bin_dir)
+    assert hashed == [csv_path]
+
+
+def test_edited_csv_is_stale(csv_path, tmp_path):
+    bin_dir = str(tmp_path / "bin")
+    binary_data.build('small', csv_path, bin_dir)
+    with open(csv_path, 'a') as f:
+        f.write("0,1,1,Common Cold\n")
+    assert binary_data.is_stale('small', csv_path, bin_dir)
+    assert len(binary_data.load('small', csv_path, bin_dir).x) == 4
+
+
+def test_build_leaves_no_temporary_files(csv_path, tmp_path):
+    bin_dir = tmp_path / "bin"
+    binary_data.build('small', csv_path, str(bin_dir))
+    assert sorted(path.name for path in bin_dir.iterdir()) == [
+        "small.labels.npy", "small.manifest.json", "small.symptoms.bits.npy"]
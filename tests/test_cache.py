@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+from cache import TTLCache
+
+
+def run_in_thread(coro_factory, results, name):
+    def target():
+        try:
+            results[name] = asyncio.run(coro_factory())
+        except BaseException as e:
+            results[name] = e
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_cancelled_waiter_does_not_cancel_shared_fetch():
+    cache = TTLCache('test-single-flight', ttl=60)
+    release = threading.Event()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.get_running_loop().run_in_executor(None, release.wait)
+        return "value"
+
+    async def leader():
+        return await cache.get_or_fetch("key", fetch)
+
+    async def waiter():
+        return await cache.get_or_fetch("key", fetch)
+
+    async def cancelled_waiter():
+        task = asyncio.ensure_future(cache.get_or_fetch("key", fetch))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        try:
+            return await task
+        except asyncio.CancelledError:
+            return "cancelled"
+
+    results = {}
+    threads = [run_in_thread(leader, results, "leader")]
+    wait_for(lambda: calls)
+    threads.append(run_in_thread(waiter, results, "waiter"))
+    threads.append(run_in_thread(cancelled_waiter, results, "cancelled"))
+    wait_for(lambda: cache.coalesced == 2)
+    wait_for(lambda: "cancelled" in results)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == {"leader": "value", "waiter": "value", "cancelled": "cancelled"}
+    assert len(calls) == 1
+    assert cache.lookup("key") == ('fresh', "value")
+
+
+def test_cancelled_leader_hands_fetch_to_waiter():
+    cache = TTLCache('test-single-flight-leader', ttl=60)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.3 if len(calls) == 1 else 0.01)
+        return "value"
+
+    async def leader():
+        task = asyncio.ensure_future(cache.get_or_fetch("key", fetch))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        try:
+            return await task
+        except asyncio.CancelledError:
+            return "cancelled"
+
+    async def waiter():
+        await asyncio.sleep(0.05)
+        return await cache.get_or_fetch("key", fetch)
+
+    results = {}
+    threads = [run_in_thread(leader, results, "leader"), run_in_thread(waiter, results, "waiter")]
+    for thread in threads:
+        thread.join(5)
+
+    assert results == {"leader": "cancelled", "waiter": "value"}
+    assert len(calls) == 2
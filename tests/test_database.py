@@ -0,0 +1,44 @@
+import sqlite3
+import threading
+
+import pytest
+
+from database import SQLiteHistory
+
+
+def turn(patient, text):
+    return {"patient": patient, "symptoms": ["cough"], "diagnosis": None, "diagnosis_time": None,
+            "conversation": [text, {"response": text.upper()}]}
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = SQLiteHistory(str(tmp_path / "history.db"))
+    history.load()
+    history.append_many([("t2", turn("ann", "a")), ("t1", turn("bob", "b")), ("t2", turn("ann", "c")),
+                         ("t3", turn("cy", "d")), ("t1", turn("bob", "e"))])
+    yield history
+    history.close()
+
+
+def test_items_matches_per_timestamp_reads_in_one_query(history):
+    expected = [(timestamp, history.read(timestamp)) for timestamp in history.timestamps()]
+    statements = []
+    history.db.get_connection().set_trace_callback(statements.append)
+    assert list(history.items()) == expected
+    assert [timestamp for timestamp, _ in expected] == ["t2", "t1", "t3"]
+    assert len(statements) == 1
+
+
+def test_close_closes_every_thread_connection(history):
+    connections = [history.db.get_connection()]
+    thread = threading.Thread(target=lambda: connections.append(history.db.get_connection()))
+    thread.start()
+    thread.join()
+
+    history.close()
+    for connection in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute('SELECT 1')
+    # Used again after close, the database opens a fresh connection
+    assert history.timestamps() == ["t2", "t1", "t3"]
@@ -0,0 +1,49 @@
+import os
+
+from history_log import HistoryLog
+
+
+def reopen(directory):
+    log = HistoryLog(directory=str(directory))
+    log.load()
+    return log
+
+
+def test_append_after_torn_first_record_of_segment(tmp_path):
+    log = reopen(tmp_path)
+    log.append("t1", {"patient": "ann", "conversation": ["hi", "hello"]})
+    log.close()
+
+    # A crash while writing the first record of the next segment
+    log = reopen(tmp_path)
+    segment = log._file.name
+    log.close()
+    with open(segment, 'ab') as f:
+        f.write(b'{"seq": 2, "time": "t2", "entry": {"patient": "ann", "conv')
+
+    log = reopen(tmp_path)
+    assert log._file.name == segment
+    log.append("t3", {"patient": "ann", "conversation": ["again", "ok"]})
+    log.close()
+
+    log = reopen(tmp_path)
+    assert log.timestamps() == ["t1", "t3"]
+    assert log.read("t3") == [{"patient": "ann", "conversation": ["again", "ok"]}]
+    assert [time for time, entry in log.entries_for_patient("ann")] == ["t1", "t3"]
+    log.compact()
+    assert dict(log.items()) == {"t1": [{"patient": "ann", "conversation": ["hi", "hello"]}],
+                                 "t3": [{"patient": "ann", "conversation": ["again", "ok"]}]}
+    log.close()
+
+
+def test_complete_segment_is_not_truncated(tmp_path):
+    log = reopen(tmp_path)
+    log.append("t1", {"patient": None, "conversation": ["a", "b"]})
+    size = os.path.getsize(log._file.name)
+    log.close()
+
+    log = reopen(tmp_path)
+    log.append("t2", {"patient": None, "conversation": ["c", "d"]})
+    log.close()
+    assert reopen(tmp_path).timestamps() == ["t1", "t2"]
+    assert size > 0
@@ -0,0 +1,53 @@
+import threading
+import time
+
+from history_writer import HistoryWriter
+
+
+class ListStore:
+    def __init__(self, gate=None):
+        self.turns = []
+        self.gate = gate
+        self.closed = False
+
+    def append_many(self, turns):
+        if self.gate is not None:
+            self.gate.wait()
+        self.turns.extend(turns)
+
+    def close(self):
+        self.closed = True
+
+
+def test_flush_waits_for_queued_turns():
+    store = ListStore()
+    writer = HistoryWriter(store)
+    for n in range(100):
+        writer.submit(f"t{n}", {"n": n})
+    assert writer.flush()
+    assert len(store.turns) == 100
+    writer.close()
+    assert store.closed
+
+
+def test_flush_gives_up_after_timeout():
+    gate = threading.Event()
+    writer = HistoryWriter(ListStore(gate))
+    writer.submit("t1", {})
+    start_time = time.monotonic()
+    assert not writer.flush(timeout=0.1)
+    assert time.monotonic() - start_time < 1
+    assert writer.stats()["flushTimeouts"] == 1
+    gate.set()
+    assert writer.flush()
+    writer.close()
+
+
+def test_submit_after_close_is_dropped():
+    store = ListStore()
+    writer = HistoryWriter(store)
+    writer.close()
+    writer.submit("t1", {})
+    assert writer.flush(timeout=1)
+    assert store.turns == []
+    assert writer.stats()["dropped"] == 1
@@ -0,0 +1,61 @@
+import pytest
+
+import search_index
+from search_index import Document, KnowledgeIndex, SearchIndex, collect_documents
+
+
+@pytest.fixture(scope="module")
+def index():
+    # MasterData plus one cached drug label; nothing fetched
+    documents = [document for document in collect_documents() if document.kind == 'disease']
+    documents.append(Document('drug', 'Aspirin', 'ASPIRIN pain reliever', {'brand_name': 'Aspirin'}))
+    knowledge_index = KnowledgeIndex()
+    search = SearchIndex()
+    for document in documents:
+        search.add(document)
+    knowledge_index._index = search.freeze()
+    knowledge_index._built_at = float('inf')
+    return knowledge_index
+
+
+def title(result):
+    kind, answer = result
+    if kind == 'drug':
+        return answer['brand_name']
+    return answer.split("\n", 1)[0][len("Title: "):] if kind else None
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("diabetes", "Diabetes"),
+    ("Diabetes symptoms", "Diabetes"),
+    ("hepatitis a", "hepatitis A"),
+    ("Hepatitis B", "Hepatitis B"),
+    ("common cold", "Common Cold"),
+    ("heart attack", "Heart attack"),
+    ("migraines", "Migraine"),
+    ("AIDS", "AIDS"),
+    ("aspirin", "Aspirin"),
+])
+def test_named_queries_resolve_locally(index, query, expected):
+    assert title(index.resolve(query)) == expected
+
+
+@pytest.mark.parametrize("query", [
+    "first aid",
+    "first aid kit",
+    "aid",
+    "hepatitis",
+    "blood sugar",
+    "diabetes diet plans for kids",
+    "paracetamol",
+    "the",
+    "",
+])
+def test_unnamed_queries_go_upstream(index, query):
+    assert index.resolve(query) == (None, None)
+
+
+def test_phrase_match_is_word_for_word():
+    assert search_index.phrase_at(["first", "aid"], ("aids",)) == -1
+    assert search_index.phrase_at(["about", "migraines"], ("migraine",)) == 1
+    assert search_index.phrase_at(["attack", "heart"], ("heart", "attack")) == -1
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+
+from session_state import LEASE_OWNER, SessionManager
+from session_store import SQLiteSessionStore
+
+
+def test_lease_excludes_other_owner_until_released(tmp_path):
+    db = str(tmp_path / "sessions.db")
+    first, second = SQLiteSessionStore(db), SQLiteSessionStore(db)
+    assert first.acquire("lock", "worker-1", 60)
+    assert not second.acquire("lock", "worker-2", 60)
+    # The holder may renew its own lease
+    assert first.acquire("lock", "worker-1", 60)
+    second.release("lock", "worker-2")
+    assert not second.acquire("lock", "worker-2", 60)
+    first.release("lock", "worker-1")
+    assert second.acquire("lock", "worker-2", 60)
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    assert store.acquire("lock", "crashed-worker", 0.05)
+    time.sleep(0.1)
+    assert store.acquire("lock", "worker-2", 60)
+
+
+def test_turn_waits_for_another_worker(tmp_path):
+    db = str(tmp_path / "sessions.db")
+    other_worker = SQLiteSessionStore(db)
+    sessions = SessionManager(store=SQLiteSessionStore(db))
+    conversation = sessions.get("sid")
+    assert other_worker.acquire("conversation:sid", "worker-2", 60)
+
+    timer = threading.Timer(0.2, other_worker.release, ("conversation:sid", "worker-2"))
+    timer.start()
+    start_time = time.monotonic()
+
+    async def turn():
+        async with conversation.lock:
+            assert not other_worker.acquire("conversation:sid", "worker-2", 60)
+            return time.monotonic() - start_time
+
+    waited = asyncio.run(turn())
+    timer.join()
+    assert waited >= 0.2
+    assert not conversation.lock.locked()
+    assert other_worker.acquire("conversation:sid", "worker-2", 60)
+
+
+def test_sync_lock_releases_lease(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    conversation = SessionManager(store=store).get("sid")
+    with conversation.lock:
+        assert not store.acquire("conversation:sid", "worker-2", 60)
+        assert store.acquire("conversation:sid", LEASE_OWNER, 60)
+    assert store.acquire("conversation:sid", "worker-2", 60)
+
+
+def test_waiters_do_not_hold_executor_threads():
+    conversation = SessionManager().get("sid")
+    order = []
+
+    async def main():
+        loop = asyncio.get_running_loop()
+
+        async def turn(n):
+            async with conversation.lock:
+                order.append(n)
+                await asyncio.sleep(0.001)
+
+        async with conversation.lock:
+            waiters = [asyncio.ensure_future(turn(n)) for n in range(50)]
+            await asyncio.sleep(0.05)
+            # Every default-executor thread is still free for other work
+            assert await asyncio.wait_for(loop.run_in_executor(None, lambda: "free"), 1) == "free"
+        await asyncio.gather(*waiters)
+
+    asyncio.run(main())
+    assert sorted(order) == list(range(50))
+    assert not conversation.lock.locked()
+
+
+def test_cancelled_waiter_leaves_lock_free():
+    conversation = SessionManager().get("sid")
+
+    async def main():
+        async def turn():
+            async with conversation.lock:
+                pass
+
+        async with conversation.lock:
+            waiter = asyncio.ensure_future(turn())
+            await asyncio.sleep(0.02)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        assert not conversation.lock.locked()
+        await asyncio.wait_for(turn(), 1)
+
+    asyncio.run(main())
@@ -0,0 +1,14 @@
+import numpy as np
+
+from symptom_index import SymptomCooccurrence
+
+
+def test_related_ranks_symptoms_by_shared_records():
+    columns = ["itching", "skin_rash", "cough", "fever"]
+    rows = np.array([[1, 1, 0, 0], [1, 1, 0, 1], [1, 0, 0, 1], [0, 0, 1, 1], [1, 1, 0, 0]])
+    cooccurrence = SymptomCooccurrence(columns, rows)
+    # itching: 3 records with skin_rash, 2 with fever, none with cough
+    assert cooccurrence.related("itching") == ["skin_rash", "fever"]
+    assert cooccurrence.related("itching", k=1) == ["skin_rash"]
+    assert cooccurrence.related("cough") == ["fever"]
+    assert cooccurrence.related("sneezing") == []
@@ -0,0 +1,54 @@
+import pytest
+
+from symptom_resolver import SymptomResolver
+
+
+@pytest.fixture(scope="module")
+def resolver(training):
+    return SymptomResolver(training.columns)
+
+
+def resolved(resolver, text):
+    return resolver.pick(resolver.resolve(text))
+
+
+@pytest.mark.parametrize('text, column', [
+    ("itching", "itching"),
+    ("Skin Rash", "skin_rash"),
+    ("chest pain", "chest_pain"),
+    ("joint_pain", "joint_pain"),
+])
+def test_exact_column_names(resolver, text, column):
+    assert resolver.resolve(text) == [(column, 1.0)]
+    assert resolved(resolver, text) == column
+
+
+@pytest.mark.parametrize('text, column', [
+    ("tummy ache", "stomach_pain"),
+    ("i have a stomach ache", "stomach_pain"),
+    ("feeling tired", "fatigue"),
+    ("low grade fever", "mild_fever"),
+    ("fever", "high_fever"),
+    ("i am throwing up since morning", "vomiting"),
+    ("i have a rash on my arm", "skin_rash"),
+])
+def test_synonyms_and_phrases(resolver, text, column):
+    assert resolved(resolver, text) == column
+
+
+def test_near_miss_resolves_when_clear(resolver):
+    assert resolved(resolver, "headaches") == "headache"
+
+
+@pytest.mark.parametrize('text', ["pain", "cheast pain"])
+def test_ambiguous_input_is_not_picked(resolver, text):
+    matches = resolver.resolve(text)
+    assert len(matches) > 1
+    assert resolved(resolver, text) is None
+
+
+@pytest.mark.parametrize('text', ["xyzzy", "", "   ", "migraine"])
+def test_no_match(resolver, text):
+    # A disease name is not a symptom
+    assert resolver.resolve(text) == []
+    assert resolved(resolver, text) is None
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from sklearn.tree import DecisionTreeClassifier
+
+import binary_data
+from tree_engine import FlatTree
+
+
+@pytest.fixture(scope="module")
+def clf(training):
+    # Fitted as build_artifact does, on string labels
+    x_unique, y_unique, weights = binary_data.compact(training.x, training.codes)
+    return DecisionTreeClassifier(random_state=0).fit(x_unique, training.classes[y_unique], sample_weight=weights)
+
+
+def random_subsets(columns, count=2000, seed=0):
+    # Symptom combinations far from the training rows, including none at all
+    rng = np.random.default_rng(seed)
+    x = np.zeros((count, columns), dtype=np.uint8)
+    for row, size in zip(x, rng.integers(0, 18, size=count)):
+        row[rng.choice(columns, size=size, replace=False)] = 1
+    return x
+
+
+def assert_same_predictions(flat_tree, clf, x):
+    expected = clf.predict(x)
+    assert (flat_tree.predict_matrix(x) == expected).all()
+    assert [flat_tree.predict_indices(np.flatnonzero(row)) for row in x] == list(expected)
+
+
+def test_matches_sklearn_on_testing_csv(clf, testing):
+    assert_same_predictions(FlatTree.from_classifier(clf), clf, testing.x)
+
+
+def test_matches_sklearn_on_random_symptom_subsets(clf, training):
+    assert_same_predictions(FlatTree.from_classifier(clf), clf, random_subsets(len(training.columns)))
+
+
+def test_saved_tree_matches_sklearn(clf, training, tmp_path):
+    path = str(tmp_path / "tree.npz")
+    FlatTree.from_classifier(clf).save(path)
+    assert_same_predictions(FlatTree.load(path), clf, random_subsets(len(training.columns), count=200, seed=1))
+
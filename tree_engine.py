@@ -0,0 +1,150 @@
+import numpy as np
+
+TREE_LEAF = -1
+
+
+class FlatTree:
+    def __init__(self, feature, threshold, children_left, children_right, leaf_class, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.leaf_class = leaf_class
+        self.classes = classes
+        # Plain lists walk faster than numpy scalars for single lookups
+        self._walk = (feature.tolist(), threshold.tolist(), children_left.tolist(), children_right.tolist())
+        self._leaf_weights, self._leaf_targets, self._leaves = self._leaf_paths()
+
+    @classmethod
+    def from_classifier(cls, clf):
+        tree = clf.tree_
+        classes = np.asarray(clf.classes_)
+        if classes.dtype == object:
+            classes = classes.astype(str)
+        # sklearn marks leaves with feature -2 (TREE_UNDEFINED)
+        feature = np.where(tree.children_left == TREE_LEAF, TREE_LEAF, tree.feature)
+        return cls(
+            feature.astype(np.int16),
+            tree.threshold.astype(np.float32),
+            tree.children_left.astype(np.int32),
+            tree.children_right.astype(np.int32),
+            np.argmax(tree.value[:, 0, :], axis=1).astype(np.int16),
+            classes,
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        return cls(data['feature'], data['threshold'], data['children_left'],
+                   data['children_right'], data['leaf_class'], data['classes'])
+
+    def save(self, path):
+        np.savez(path, feature=self.feature, threshold=self.threshold,
+                 children_left=self.children_left, children_right=self.children_right,
+                 leaf_class=self.leaf_class, classes=self.classes)
+
+    def _leaf_paths(self):
+        # Each leaf as one column: +1 for a feature its path requires present,
+        # -1 for one it requires absent. A 0/1 row reaches the leaf exactly
+        # when its dot product with the column equals the number of +1s.
+        feature, threshold, children_left, children_right = self._walk
+        width = max(feature) + 1
+        leaves, columns = [], []
+        stack = [(0, {})]
+        while stack:
+            node, path = stack.pop()
+            if feature[node] == TREE_LEAF:
+                column = np.zeros(width, dtype=np.float32)
+                for index, present in path.items():
+                    column[index] = 1.0 if present else -1.0
+                leaves.append(node)
+                columns.append(column)
+                continue
+            # 0 goes left when threshold >= 0, 1 goes left when threshold >= 1
+            if 0 <= threshold[node] < 1:
+                stack.append((children_left[node], {**path, feature[node]: False}))
+                stack.append((children_right[node], {**path, feature[node]: True}))
+            elif threshold[node] >= 1:
+                stack.append((children_left[node], path))
+            else:
+                stack.append((children_right[node], path))
+        weights = np.stack(columns, axis=1)
+        return weights, (weights > 0).sum(axis=0).astype(np.float32), np.array(leaves, dtype=np.int32)
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    def is_leaf(self, node):
+        return self.feature[node] == TREE_LEAF
+
+    def node_class(self, node):
+        return self.classes[self.leaf_class[node]].item()
+
+    def leaf_for_indices(self, indices):
+        # Walk from the root; a feature is 1 when its index is in `indices`
+        present = indices if isinstance(indices, (set, frozenset)) else set(indices)
+        feature, threshold, children_left, children_right = self._walk
+        node = 0
+        while feature[node] != TREE_LEAF:
+            value = 1.0 if feature[node] in present else 0.0
+            if value <= threshold[node]:
+                node = children_left[node]
+            else:
+                node = children_right[node]
+        return node
+
+    def predict_indices(self, indices):
+        return self.node_class(self.leaf_for_indices(indices))
+
+    def predict_matrix(self, x):
+        # x holds 0/1 symptom flags. One matrix product scores every leaf
+        # for every row, instead of one pass per tree level.
+        x = np.asarray(x)[:, :len(self._leaf_weights)].astype(np.float32)
+        reached = np.argmax(x @ self._leaf_weights == self._leaf_targets, axis=1)
+        return self.classes[self.leaf_class[self._leaves[reached]]]
+
+
+if __name__ == "__main__":
+    # Equivalence and latency check against sklearn on Data/Testing.csv
+    import time
+    import warnings
+    import binary_data
+    from model_store import model_store
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+    flat_tree = model_store.load().flat_tree
+    clf = model_store.load_classifier()
+
+    x_test = binary_data.load('testing').x
+    index_sets = [set(np.flatnonzero(row)) for row in x_test]
+
+    expected = clf.predict(x_test)
+    assert (flat_tree.predict_matrix(x_test) == expected).all(), "predict_matrix differs from sklearn"
+    assert [flat_tree.predict_indices(s) for s in index_sets] == list(expected), "predict_indices differs from sklearn"
+    print(f"Equivalent to sklearn on {len(x_test)} test rows ({flat_tree.node_count} nodes)")
+
+    def per_call_us(fn, repeat=200):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for i in range(len(x_test)):
+                fn(i)
+        return (time.perf_counter() - start) / (repeat * len(x_test)) * 1e6
+
+    print(f"sklearn clf.predict (1 row):      {per_call_us(lambda i: clf.predict(x_test[i:i + 1]), repeat=10):8.2f} us")
+    print(f"FlatTree.predict_indices (1 row): {per_call_us(lambda i: flat_tree.predict_indices(index_sets[i])):8.2f} us")
+
+    def per_batch_ms(fn, batch, repeat):
+        fn(batch)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn(batch)
+        return (time.perf_counter() - start) / repeat * 1e3
+
+    # ChatBot.predict_batch switches to sklearn where it starts winning
+    for rows in (1, 100, 1000, 2000, 4100, 41000):
+        batch = np.tile(x_test, (rows // len(x_test) + 1, 1))[:rows]
+        repeat = max(5, 20000 // rows)
+        print(f"Batch of {rows:5d}: sklearn {per_batch_ms(clf.predict, batch, repeat):7.3f} ms, "
+              f"FlatTree {per_batch_ms(flat_tree.predict_matrix, batch, repeat):7.3f} ms")